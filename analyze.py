@@ -0,0 +1,138 @@
+#%% Library import
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_processing import chunks, map_in_order
+from code import (GameNode, SearchStats, TranspositionTable, ai_choose_move, divisor_played, exact_value,
+                  process_turn, solve_exact)
+
+#%% Positions
+# One position per line: number, player_score, ai_score, bank and the side
+# to move ("player" or "ai"), separated by spaces or commas. Blank lines and
+# lines starting with # are skipped. The side to move is searched as the AI,
+# so values are from its point of view.
+
+def parse_position(line):
+    """Return (number, player_score, ai_score, bank, is_player_turn) from one input line"""
+    fields = line.replace(",", " ").split()
+    if len(fields) != 5:
+        raise ValueError("expected number, player_score, ai_score, bank and side to move")
+    number, player_score, ai_score, bank = (int(field) for field in fields[:4])
+    side = fields[4].lower()
+    if side not in ("player", "ai"):
+        raise ValueError(f"side to move must be player or ai, not {fields[4]}")
+    if number <= 10:
+        raise ValueError("the game is already over")
+    return number, player_score, ai_score, bank, side == "player"
+
+def read_positions(lines):
+    """Yield (line_number, position or None, error or None) for every position line"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            yield line_number, parse_position(line), None
+        except ValueError as error:
+            yield line_number, None, str(error)
+
+#%% Analysis
+
+def analyze_position(position, engine, parameter, use_tablebase, audit):
+    """Search one position and return its result as a dict"""
+    number, player_score, ai_score, bank, is_player_turn = position
+    if is_player_turn:
+        # Search the player's move as if the player were the AI
+        player_score, ai_score = ai_score, player_score
+    iterations = []
+    table = TranspositionTable()
+    result, thinking_time, stats = ai_choose_move(
+        number, player_score, ai_score, bank, engine == "alphabeta", parameter, table, lazy=True,
+        use_tablebase=use_tablebase, time_budget_ms=parameter if engine == "timed" else None,
+        use_pvs=engine == "pvs", stats=SearchStats(),
+        on_iteration=lambda depth, best_move, score: iterations.append(score))
+
+    root = GameNode(number, player_score, ai_score, bank, False)
+    best_move = divisor_played(number, result.number)
+    if stats.source == "search":
+        # The table holds the whole line; the nodes' best_move links stop at table hits
+        pv = table.principal_variation(root, max(stats.search_depth, 1)) or [best_move]
+        value = iterations[-1] if iterations else result.score
+    else:
+        pv = [best_move]
+        value = exact_value(root)
+    analysis = {
+        "position": list(position),
+        "best_move": best_move,
+        "value": value,
+        "pv": pv,
+        "source": stats.source,
+        "depth": stats.search_depth,
+        "nodes": stats.nodes,
+        "nodes_generated": stats.nodes_generated,
+        "evaluations": stats.evaluations,
+        "time": thinking_time,
+    }
+    if audit:
+        # Several moves can force the best margin, so compare margins rather than moves
+        margin, divisor = solve_exact(number, bank)
+        new_number, gain, new_bank = process_turn(round(number / best_move), 0, bank)
+        analysis["exact_move"] = divisor
+        analysis["exact_margin"] = margin
+        analysis["move_margin"] = gain - solve_exact(new_number, new_bank)[0]
+        analysis["agrees"] = analysis["move_margin"] == margin
+    return analysis
+
+def analyze_chunk(task):
+    """Worker side: analyze a list of (line_number, position, error) entries"""
+    entries, engine, parameter, use_tablebase, audit = task
+    results = []
+    for line_number, position, error in entries:
+        if error is None:
+            results.append({"line": line_number, **analyze_position(position, engine, parameter, use_tablebase, audit)})
+        else:
+            results.append({"line": line_number, "error": error})
+    return results
+
+#%% Command line
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a stream of positions with the game engines")
+    parser.add_argument("input", nargs="?", default="-", help="File of positions (- for stdin)")
+    parser.add_argument("--output", default="-", help="JSON lines file for the results (- for stdout)")
+    parser.add_argument("--engine", default="alphabeta:6",
+                        help="minimax:D, alphabeta:D, pvs:D (depth) or timed:MS (milliseconds per position)")
+    parser.add_argument("--tablebase", action="store_true",
+                        help="Use the opening book and tablebase when they apply")
+    parser.add_argument("--audit", action="store_true",
+                        help="Compare each move with the exact solution (margins for the rest of the game)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Positions sent to a worker at a time")
+    args = parser.parse_args()
+
+    engine, _, parameter = args.engine.partition(":")
+    if engine not in ("minimax", "alphabeta", "pvs", "timed"):
+        parser.error(f"unknown engine: {args.engine}")
+    parameter = int(parameter) if parameter else (100 if engine == "timed" else 6)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    # A few chunks per worker in flight, results written in input order
+    max_in_flight = 4 * (args.workers or 1)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            tasks = ((chunk, engine, parameter, args.tablebase, args.audit)
+                     for chunk in chunks(read_positions(source), args.chunk_size))
+            for results in map_in_order(executor, analyze_chunk, tasks, max_in_flight):
+                for result in results:
+                    output.write(json.dumps(result) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+#%% Library import
+from collections import deque
+
+#%% Batches
+# The command line tools (analyze.py, replay_games.py) stream their input to
+# a process pool in chunks. Only a few chunks are in flight at a time, so
+# memory does not grow with the input, and results come back in input order.
+
+def chunks(entries, size):
+    """Group an iterator into lists of `size` items without reading ahead"""
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def map_in_order(executor, function, tasks, max_in_flight):
+    """executor.map that submits at most `max_in_flight` tasks ahead of the result being read"""
+    in_flight = deque()
+    for task in tasks:
+        in_flight.append(executor.submit(function, task))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
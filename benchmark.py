@@ -0,0 +1,198 @@
+#%% Library import
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from code import (GameNode, GameTree, MoveOrdering, SearchStats, TranspositionTable, alpha_beta,
+                  alpha_beta_search, count_nodes, generate_game_tree, minimax, minimax_search, np,
+                  parallel_search, pvs_search, vectorized_minimax)
+
+#%% Engines
+# Each engine takes (root, depth, stats), searches `root` for the maximizing
+# side and returns (tree_generation_time, search_time, generated_nodes).
+# Register new engines in ENGINES to have them benchmarked.
+
+def run_tree_engine(search, table=False, ordering=False):
+    def run(root, depth, stats):
+        start_time = time.perf_counter()
+        generate_game_tree(root, 0, depth)
+        tree_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        if search is minimax:
+            minimax(root, depth, True, TranspositionTable() if table else None, stats)
+        else:
+            alpha_beta(root, depth, -math.inf, math.inf, True, TranspositionTable() if table else None,
+                       MoveOrdering() if ordering else None, stats)
+        return tree_time, time.perf_counter() - start_time, count_nodes(root)
+    return run
+
+def run_compact_alpha_beta(root, depth, stats):
+    start_time = time.perf_counter()
+    tree = GameTree(root.number, root.player_score, root.ai_score, root.bank, root.is_player_turn, depth).build()
+    tree_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    alpha_beta(tree.root, depth, -math.inf, math.inf, True, None, None, stats)
+    return tree_time, time.perf_counter() - start_time, 1 + sum(tree.child_count)
+
+def run_lazy_engine(search, table=False, ordering=False):
+    def run(root, depth, stats):
+        nodes_before = stats.nodes
+        start_time = time.perf_counter()
+        if search is minimax_search:
+            minimax_search(root, depth, True, TranspositionTable() if table else None, None, stats)
+        elif search is pvs_search:
+            pvs_search(root, depth, -math.inf, math.inf, True, TranspositionTable(), None,
+                       MoveOrdering() if ordering else None, stats)
+        else:
+            alpha_beta_search(root, depth, -math.inf, math.inf, True, TranspositionTable() if table else None,
+                              None, MoveOrdering() if ordering else None, stats)
+        # Nodes are only created as the search visits them
+        return 0.0, time.perf_counter() - start_time, stats.nodes - nodes_before
+    return run
+
+def run_parallel_search(root, depth, stats):
+    nodes_before = stats.nodes
+    start_time = time.perf_counter()
+    parallel_search(root, depth, True, None, stats)
+    return 0.0, time.perf_counter() - start_time, stats.nodes - nodes_before
+
+def run_vectorized_minimax(root, depth, stats):
+    nodes_before = stats.nodes
+    start_time = time.perf_counter()
+    vectorized_minimax(root, depth, True, stats)
+    # The whole tree is expanded in arrays, there is no separate generation step
+    return 0.0, time.perf_counter() - start_time, stats.nodes - nodes_before
+
+ENGINES = {
+    "minimax": run_tree_engine(minimax),
+    "alpha_beta": run_tree_engine(alpha_beta),
+    "alpha_beta_tt_ordered": run_tree_engine(alpha_beta, table=True, ordering=True),
+    "compact_alpha_beta": run_compact_alpha_beta,
+    "minimax_search": run_lazy_engine(minimax_search),
+    "alpha_beta_search": run_lazy_engine(alpha_beta_search),
+    "alpha_beta_search_tt_ordered": run_lazy_engine(alpha_beta_search, table=True, ordering=True),
+    "pvs_search_ordered": run_lazy_engine(pvs_search, table=True, ordering=True),
+    "parallel_search": run_parallel_search,
+}
+if np is not None:  # NumPy is optional
+    ENGINES["vectorized_minimax"] = run_vectorized_minimax
+
+#%% Benchmark
+
+def benchmark_positions(seed, count):
+    """Fixed starting positions drawn from the 20000-30000 range of generate_initial_numbers"""
+    rng = random.Random(seed)
+    return [rng.randint(20000, 30000) for _ in range(count)]
+
+def benchmark_engine(engine, positions, depth, repeat):
+    """Time one engine at one depth over every position, keeping the best of `repeat` runs"""
+    tree_time = search_time = math.inf
+    for _ in range(repeat):
+        run_tree_time = run_search_time = 0.0
+        stats = SearchStats()
+        generated_nodes = 0
+        for number in positions:
+            result = engine(GameNode(number, 0, 0, 0, False), depth, stats)
+            run_tree_time += result[0]
+            run_search_time += result[1]
+            generated_nodes += result[2]
+        tree_time = min(tree_time, run_tree_time)
+        search_time = min(search_time, run_search_time)
+
+    # Separate pass for memory, tracemalloc would distort the timings
+    peak_memory = 0
+    for number in positions:
+        tracemalloc.start()
+        engine(GameNode(number, 0, 0, 0, False), depth, SearchStats())
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "tree_time": tree_time,
+        "search_time": search_time,
+        "total_time": tree_time + search_time,
+        "generated_nodes": generated_nodes,
+        "nodes": stats.nodes,
+        "nodes_per_second": stats.nodes / search_time if search_time else None,
+        "peak_memory": peak_memory,
+    }
+
+def git_commit():
+    """Commit of the benchmarked tree, if it is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Return a description of every result slower or larger than `baseline` beyond `tolerance`"""
+    previous = {(entry["engine"], entry["depth"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry["engine"], entry["depth"]))
+        if old is None:
+            continue
+        for metric in ("total_time", "nodes", "peak_memory"):
+            if old[metric] and entry[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{entry['engine']} depth {entry['depth']}: {metric} "
+                                   f"{old[metric]:.6g} -> {entry[metric]:.6g}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search engines on fixed starting positions")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--depths", nargs="+", type=int, default=[2, 3, 4, 5, 6])
+    parser.add_argument("--positions", type=int, default=20, help="Number of starting positions")
+    parser.add_argument("--seed", type=int, default=12345, help="Seed of the starting positions")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement, the fastest is kept")
+    parser.add_argument("--output", default="-", help="JSON file for the results (- for stdout)")
+    parser.add_argument("--compare", help="Earlier results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before reporting")
+    args = parser.parse_args()
+
+    positions = benchmark_positions(args.seed, args.positions)
+    results = []
+    for engine_name in args.engines:
+        for depth in args.depths:
+            entry = {"engine": engine_name, "depth": depth}
+            entry.update(benchmark_engine(ENGINES[engine_name], positions, depth, args.repeat))
+            results.append(entry)
+            print(f"{engine_name:>30} depth {depth}: {entry['total_time'] * 1000:9.2f} ms, "
+                  f"{entry['nodes']:8d} nodes, {entry['peak_memory'] / 1024:8.1f} KiB peak", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "positions": positions,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("positions") != positions:
+            print("Warning: the baseline was measured on other positions", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
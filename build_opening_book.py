@@ -0,0 +1,23 @@
+#%% Library import
+import argparse
+import time
+
+from code import BOOK_MAX_BANK, BOOK_MAX_NUMBER, OPENING_BOOK_PATH, write_opening_book
+
+#%% Build the opening book
+# Usage: python build_opening_book.py [--output opening_book.bin]
+# ai_choose_move picks the file up automatically from OPENING_BOOK_PATH.
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the exact best move for every game state")
+    parser.add_argument("--output", default=OPENING_BOOK_PATH, help="Path of the book file to write")
+    parser.add_argument("--max-number", type=int, default=BOOK_MAX_NUMBER, help="Largest number to solve")
+    parser.add_argument("--max-bank", type=int, default=BOOK_MAX_BANK, help="Largest bank value to solve")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    write_opening_book(args.output, args.max_number, args.max_bank)
+    print(f"Wrote {args.output} in {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,31 @@ import tkinter as tk
 import random
 import math
 import time
+import os
+import mmap
+import struct
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+
+from game_records import (GAME_RECORDS_PATH, GameRecord, GameRecordWriter, decode_state, encode_state,
+                          read_game_records)
+
+try:
+    import numpy as np
+except ImportError:  # Only the vectorized search needs NumPy
+    np = None
 
 #%% Game Tree Structure
 
 class GameNode:
     """Tree node to represent game states"""
+    __slots__ = ("number", "player_score", "ai_score", "bank", "is_player_turn", "children", "score", "best_move",
+                 "packed_key")
+
     def __init__(self, number, player_score, ai_score, bank, is_player_turn):
         self.number = number
         self.player_score = player_score
@@ -16,6 +36,7 @@ class GameNode:
         self.children = []
         self.score = None
         self.best_move = None
+        self.packed_key = None  # Filled in by key() on first use
     
     def add_child(self, child_node):
         """Add a child node to this node"""
@@ -26,6 +47,238 @@ class GameNode:
         """Check if this is a terminal state (game over)"""
         return self.number <= 10
 
+    def key(self):
+        """Return the full game state packed by encode_state, used to detect transpositions"""
+        if self.packed_key is None:
+            self.packed_key = encode_state(self.number, self.player_score, self.ai_score, self.bank,
+                                           self.is_player_turn)
+        return self.packed_key
+
+    def child_for(self, divisor):
+        """Return the child reached by dividing by `divisor`, if it was generated"""
+        if not self.children:
+            return None
+        return self.children[divisor - 2]  # Children are always generated in [2, 3, 4] order
+
+#%% Compact Tree Storage
+
+class GameTree:
+    """Game tree stored in parallel typed arrays indexed by node id
+
+    The tree is a complete 3-ary tree: the children of node `i` live at
+    `3*i + 1`, `3*i + 2` and `3*i + 3` for the divisors 2, 3 and 4, so no
+    per-node objects or child lists are needed. `root` returns a
+    TreeNodeView that offers the GameNode API on top of the arrays.
+    """
+    def __init__(self, number, player_score, ai_score, bank, is_player_turn, max_depth):
+        self.max_depth = max_depth
+        size = (3 ** (max_depth + 1) - 1) // 2
+        self.internal_count = (3 ** max_depth - 1) // 2  # Nodes with room for children
+        self.number = array('i', bytes(4 * size))
+        self.player_score = array('i', bytes(4 * size))
+        self.ai_score = array('i', bytes(4 * size))
+        self.bank = array('i', bytes(4 * size))
+        self.is_player_turn = array('b', bytes(size))
+        self.child_count = array('b', bytes(size))
+        self.best_index = array('b', [-1]) * size
+        self.score = array('d', [math.nan]) * size
+        self.set_state(0, number, player_score, ai_score, bank, is_player_turn)
+        self.root = TreeNodeView(self, 0)
+
+    def set_state(self, index, number, player_score, ai_score, bank, is_player_turn):
+        """Write a game state into slot `index`"""
+        self.number[index] = number
+        self.player_score[index] = player_score
+        self.ai_score[index] = ai_score
+        self.bank[index] = bank
+        self.is_player_turn[index] = is_player_turn
+
+    def build(self, table=None, stats=None, cancel_event=None):
+        """Expand every non-terminal node down to `max_depth`, one level at a time
+
+        Like generate_game_tree, states already solved exactly in `table` are
+        not expanded. Leaves are left unscored; the search evaluates them.
+        Raises SearchTimeout before the next level once `cancel_event` is set.
+        """
+        child_count = self.child_count
+        for level in range(self.max_depth):
+            if cancel_event is not None and cancel_event.is_set():
+                raise SearchTimeout
+            first, last = (3 ** level - 1) // 2, (3 ** (level + 1) - 1) // 2
+            numbers = self.number[first:last]
+
+            # Decide which nodes of this level get children
+            counts = array('b', bytes(last - first))
+            for offset, current in enumerate(numbers):
+                index = first + offset
+                if index and not child_count[(index - 1) // 3] or current <= 10:
+                    continue  # Below a leaf, or terminal
+                if table is not None and index:
+                    entry = table.probe(self.key(index))
+                    if entry is not None and entry.flag == EXACT and entry.depth >= self.max_depth - level:
+                        self.score[index] = entry.value
+                        continue
+                counts[offset] = 3
+            child_count[first:last] = counts
+            if stats is not None:
+                stats.nodes_generated += sum(counts)
+
+            # Write all three children of every node at once (slots below
+            # leaves are filled too but never reached through child_count).
+            # Same rules as process_turn; the side to move is the same for
+            # the whole level.
+            new_numbers = [round(current / divisor) for current in numbers for divisor in (2, 3, 4)]
+            gains = [1 if new_number % 2 else -1 for new_number in new_numbers]
+            children = slice(3 * first + 1, 3 * last + 1)
+            player_scores = [score for score in self.player_score[first:last] for _ in range(3)]
+            ai_scores = [score for score in self.ai_score[first:last] for _ in range(3)]
+            if self.is_player_turn[first]:
+                player_scores = [score + gain for score, gain in zip(player_scores, gains)]
+            else:
+                ai_scores = [score + gain for score, gain in zip(ai_scores, gains)]
+            self.number[children] = array('i', new_numbers)
+            self.player_score[children] = array('i', player_scores)
+            self.ai_score[children] = array('i', ai_scores)
+            self.bank[children] = array('i', [bank + (new_number % 5 == 0) for bank, new_number in
+                                              zip([bank for bank in self.bank[first:last] for _ in range(3)], new_numbers)])
+            self.is_player_turn[children] = array('b', [not self.is_player_turn[first]]) * (3 * (last - first))
+        return self
+
+    def key(self, index):
+        """Return the full game state of node `index`, packed by encode_state"""
+        return encode_state(self.number[index], self.player_score[index], self.ai_score[index],
+                            self.bank[index], self.is_player_turn[index])
+
+class TreeNodeView:
+    """Lightweight handle on one node of a GameTree, usable wherever a GameNode is"""
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    number = property(lambda self: self.tree.number[self.index])
+    player_score = property(lambda self: self.tree.player_score[self.index])
+    ai_score = property(lambda self: self.tree.ai_score[self.index])
+    bank = property(lambda self: self.tree.bank[self.index])
+    is_player_turn = property(lambda self: bool(self.tree.is_player_turn[self.index]))
+
+    @property
+    def children(self):
+        first = 3 * self.index + 1
+        return [TreeNodeView(self.tree, child) for child in range(first, first + self.tree.child_count[self.index])]
+
+    @property
+    def score(self):
+        score = self.tree.score[self.index]
+        return None if math.isnan(score) else score
+
+    @score.setter
+    def score(self, value):
+        self.tree.score[self.index] = math.nan if value is None else value
+
+    @property
+    def best_move(self):
+        offset = self.tree.best_index[self.index]
+        return None if offset < 0 else TreeNodeView(self.tree, 3 * self.index + 1 + offset)
+
+    @best_move.setter
+    def best_move(self, child):
+        self.tree.best_index[self.index] = -1 if child is None else child.index - 3 * self.index - 1
+
+    def add_child(self, child_node):
+        """Copy `child_node`'s state into this node's next free child slot"""
+        tree = self.tree
+        if self.index >= tree.internal_count or tree.child_count[self.index] == 3:
+            raise ValueError("No room left for a child at this node")
+        child = 3 * self.index + 1 + tree.child_count[self.index]
+        tree.set_state(child, child_node.number, child_node.player_score, child_node.ai_score,
+                       child_node.bank, child_node.is_player_turn)
+        tree.child_count[self.index] += 1
+        return TreeNodeView(tree, child)
+
+    def is_terminal(self):
+        """Check if this is a terminal state (game over)"""
+        return self.tree.number[self.index] <= 10
+
+    def key(self):
+        """Return the full game state packed by encode_state, used to detect transpositions"""
+        return self.tree.key(self.index)
+
+    def child_for(self, divisor):
+        """Return the child reached by dividing by `divisor`, if it was generated"""
+        if self.tree.child_count[self.index] < divisor - 1:
+            return None
+        return TreeNodeView(self.tree, 3 * self.index + divisor - 1)
+
+#%% Transposition Table
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class TTEntry:
+    """Search result stored for one game state"""
+    __slots__ = ("value", "flag", "depth", "best_move")
+
+    def __init__(self, value, flag, depth, best_move):
+        self.value = value
+        self.flag = flag  # EXACT, LOWER_BOUND or UPPER_BOUND
+        self.depth = depth  # Remaining depth the value was searched to
+        self.best_move = best_move  # Best divisor found, or None
+
+class TranspositionTable:
+    """Bounded cache of searched game states with least-recently-used eviction"""
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def probe(self, key):
+        """Return the entry stored for `key`, or None"""
+        self.probes += 1
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, value, flag, depth, best_move):
+        """Store a search result, keeping deeper results over shallower ones"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if entry.depth > depth:
+                return
+            entry.value, entry.flag, entry.depth, entry.best_move = value, flag, depth, best_move
+            return
+        if len(self.entries) >= self.max_entries:
+            self.entries.popitem(last=False)  # Evict the least recently used state
+        self.entries[key] = TTEntry(value, flag, depth, best_move)
+
+    def clear(self):
+        """Forget every stored state"""
+        self.entries.clear()
+        self.probes = 0
+        self.hits = 0
+
+    def principal_variation(self, node, max_length):
+        """Divisors of the stored best moves from `node` on, at most `max_length` of them
+
+        Unlike the best_move links a search leaves on its nodes, this line
+        goes on through the states the search answered from the table.
+        """
+        pv = []
+        while len(pv) < max_length and not node.is_terminal():
+            entry = self.entries.get(node.key())
+            if entry is None or not entry.best_move:
+                break
+            pv.append(entry.best_move)
+            node = make_move(node, entry.best_move)
+        return pv
+
 #%% Side functions
 
 def generate_initial_numbers():
@@ -47,6 +300,22 @@ def process_turn(new_number, player_score, bank):
         
     return new_number, player_score, bank
 
+def make_move(node, divisor):
+    """Return a new node for the state reached by dividing the node's number by `divisor`"""
+    new_number = round(node.number / divisor)
+    if node.is_player_turn:
+        new_number, player_score, new_bank = process_turn(new_number, node.player_score, node.bank)
+        return GameNode(new_number, player_score, node.ai_score, new_bank, False)
+    new_number, ai_score, new_bank = process_turn(new_number, node.ai_score, node.bank)
+    return GameNode(new_number, node.player_score, ai_score, new_bank, True)
+
+def divisor_played(number, new_number):
+    """Recover the divisor that turned `number` into `new_number`"""
+    for divisor in [2, 3, 4]:
+        if round(number / divisor) == new_number:
+            return divisor
+    raise ValueError(f"{new_number} cannot follow {number}")
+
 #%% Heuristic
 
 def evaluate_state(node):
@@ -104,17 +373,144 @@ def evaluate_state(node):
     
     return score
 
+#%% Search Statistics
+
+class SearchStats:
+    """Counters and timers filled in by a search and returned by ai_choose_move"""
+    def __init__(self):
+        self.nodes = 0  # Nodes visited by the search
+        self.nodes_generated = 0  # Nodes created, up front by tree generation or on the fly
+        self.nodes_reused = 0  # Nodes kept from the previous turn's tree
+        self.evaluations = 0  # Calls to evaluate_state
+        self.extended_leaves = 0  # Leaves played out to the end of the game by an EndgameExtension
+        self.cutoffs = 0  # Alpha-beta cutoffs
+        self.cutoffs_by_depth = {}  # Remaining depth -> cutoffs made there (deepest iteration only)
+        self.table_probes = 0
+        self.table_hits = 0
+        self.search_depth = 0  # Depth of the search (deepest completed one when deepening)
+        self.tree_generation_time = 0.0
+        self.search_time = 0.0
+        self.evaluation_time = 0.0  # Part of the two times above spent in evaluate_state
+        self.source = "search"  # "search", or "tablebase" when the move came from the exact solution
+
+    def evaluate(self, node):
+        """evaluate_state, counted and timed"""
+        start_time = time.perf_counter()
+        score = evaluate_state(node)
+        self.evaluation_time += time.perf_counter() - start_time
+        self.evaluations += 1
+        return score
+
+    def record_cutoff(self, depth):
+        self.cutoffs += 1
+        self.cutoffs_by_depth[depth] = self.cutoffs_by_depth.get(depth, 0) + 1
+
+    @property
+    def total_time(self):
+        return self.tree_generation_time + self.search_time
+
+    @property
+    def effective_branching_factor(self):
+        """Branching factor of a uniform tree of the same depth and size"""
+        if not self.search_depth or not self.nodes:
+            return 0.0
+        return self.nodes ** (1 / self.search_depth)
+
+    def cutoffs_per_ply(self):
+        """Cutoffs counted by distance from the root (of the deepest iteration when deepening)"""
+        return {self.search_depth - depth: count for depth, count in sorted(self.cutoffs_by_depth.items(), reverse=True)}
+
+    def as_dict(self):
+        """Plain dict of every figure, for logs and machine-readable output"""
+        return {
+            "source": self.source,
+            "search_depth": self.search_depth,
+            "nodes": self.nodes,
+            "nodes_generated": self.nodes_generated,
+            "nodes_reused": self.nodes_reused,
+            "evaluations": self.evaluations,
+            "extended_leaves": self.extended_leaves,
+            "cutoffs": self.cutoffs,
+            "cutoffs_per_ply": self.cutoffs_per_ply(),
+            "effective_branching_factor": self.effective_branching_factor,
+            "table_probes": self.table_probes,
+            "table_hits": self.table_hits,
+            "tree_generation_time": self.tree_generation_time,
+            "search_time": self.search_time,
+            "evaluation_time": self.evaluation_time,
+            "total_time": self.total_time,
+        }
+
+    def summary(self):
+        """A few lines of text describing the search, for display"""
+        if self.source != "search":
+            return f"AI Thinking Time: {self.total_time:.2f} seconds (exact {self.source})"
+        return (f"AI Thinking Time: {self.total_time:.2f} seconds "
+                f"(tree {self.tree_generation_time:.2f}, search {self.search_time:.2f}, "
+                f"evaluation {self.evaluation_time:.2f})\n"
+                f"Depth {self.search_depth}: {self.nodes} nodes searched, {self.nodes_generated} generated, "
+                f"{self.nodes_reused} reused, {self.evaluations} evaluated, {self.extended_leaves} extended\n"
+                f"Cutoffs: {self.cutoffs}, branching factor {self.effective_branching_factor:.2f}, "
+                f"table hits {self.table_hits}/{self.table_probes}")
+
+_search_stats_hooks = []
+
+def subscribe_search_stats(callback):
+    """Call `callback(stats)` after every ai_choose_move (from the thread that ran it)"""
+    _search_stats_hooks.append(callback)
+
+def unsubscribe_search_stats(callback):
+    _search_stats_hooks.remove(callback)
+
 #%% Game Tree Generation
 
-def generate_game_tree(node, depth, max_depth):
-    """Generate a game tree to the specified depth"""
+def generate_game_tree(node, depth, max_depth, table=None, transpositions=None, stats=None, extension=None,
+                       scored=None, cancel_event=None):
+    """Generate a game tree to the specified depth
+
+    Transposed states reached with the same remaining depth share a single
+    subtree, and states already solved exactly in `table` are not expanded.
+    Nodes that already have children (a tree kept from an earlier turn) are
+    not rebuilt: only the plies missing below them are generated.
+    Leaves are scored by leaf_value, so an EndgameExtension plays them out,
+    and added to `scored` when one is passed (see minimax). Raises
+    SearchTimeout once `cancel_event` is set: nodes whose expansion was not
+    finished are left without children, as they were before.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchTimeout
     if depth >= max_depth or node.is_terminal():
-        node.score = evaluate_state(node)
+        node.score = leaf_value(node, stats, extension)
+        if scored is not None:
+            scored.add(node)
+        return node
+
+    if table is not None and depth > 0:
+        entry = table.probe(node.key())
+        if entry is not None and entry.flag == EXACT and entry.depth >= max_depth - depth:
+            node.score = entry.value
+            return node
+
+    if transpositions is None:
+        transpositions = {}
+
+    if node.children:
+        # Extend the frontier of the subtree generated by an earlier search
+        for child in node.children:
+            child_key = (child.key(), depth + 1)
+            if child_key not in transpositions:
+                transpositions[child_key] = child
+                generate_game_tree(child, depth + 1, max_depth, table, transpositions, stats, extension, scored,
+                                   cancel_event)
         return node
     
     # Toujours utiliser les trois diviseurs, peu importe si le nombre est divisible
     possible_divisors = [2, 3, 4]
     
+    # The children are attached only once all their subtrees are complete, so a
+    # cancelled generation never leaves a node (possibly shared with a forked
+    # ReusableTree) half expanded
+    children = []
     for divisor in possible_divisors:
         # Arrondir au lieu de simplement diviser
         new_number = round(node.number / divisor)
@@ -127,104 +523,1273 @@ def generate_game_tree(node, depth, max_depth):
             player_score, ai_score = node.player_score, node.ai_score
             new_number, ai_score, new_bank = process_turn(new_number, ai_score, node.bank)
             
+        # Reuse the subtree of a transposed state if it was already generated
+        child_key = (encode_state(new_number, player_score, ai_score, new_bank, not node.is_player_turn), depth + 1)
+        child = transpositions.get(child_key)
+        if child is not None:
+            children.append(child)
+            continue
+
         # Create child node
         child = GameNode(new_number, player_score, ai_score, new_bank, not node.is_player_turn)
-        node.add_child(child)
+        transpositions[child_key] = child
+        if stats is not None:
+            stats.nodes_generated += 1
         
         # Recursively generate subtree
-        generate_game_tree(child, depth + 1, max_depth)
+        generate_game_tree(child, depth + 1, max_depth, table, transpositions, stats, extension, scored, cancel_event)
+        children.append(child)
     
+    for child in children:
+        node.add_child(child)
     return node
 
+class ReusableTree:
+    """Game tree kept between turns and re-rooted on the state the game reached
+
+    The AI's next position is a grandchild of its last root (its own move
+    then the player's reply), so most of the last tree is still valid.
+    """
+    def __init__(self):
+        self.root = None
+
+    def clear(self):
+        self.root = None
+
+    def fork(self):
+        """A tree sharing this one's nodes whose root moves independently of it"""
+        tree = ReusableTree()
+        tree.root = self.root
+        return tree
+
+    def reroot(self, number, player_score, ai_score, bank, is_player_turn):
+        """Return the kept node for this state, or a new root if the tree does not contain it"""
+        key = encode_state(number, player_score, ai_score, bank, is_player_turn)
+        if self.root is not None and self.root.key() != key:
+            frontier = self.root.children + [grandchild for child in self.root.children
+                                             for grandchild in child.children]
+            self.root = next((node for node in frontier if node.key() == key), None)
+        if self.root is None:
+            self.root = GameNode(*decode_state(key))
+        return self.root
+
+def count_nodes(root):
+    """Number of distinct nodes in a generated tree (transposed subtrees are shared)"""
+    seen = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.children)
+    return len(seen)
+
 #%% Minimax 
 
-def minimax(node, depth, is_maximizing):
-    """Minimax algorithm implementation"""
+def minimax(node, depth, is_maximizing, table=None, stats=None, extension=None, scored=None, cancel_event=None):
+    """Minimax algorithm implementation
+
+    `scored` is a set of nodes whose score is final: they are not searched
+    again, and every node scored here joins it. Share it only between
+    searches of one generated graph with the same max_depth.
+    Raises SearchTimeout once `cancel_event` is set.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchTimeout
+    if scored is not None and node in scored:
+        return node.score
+    if stats is not None:
+        stats.nodes += 1
+    if table is not None:
+        entry = table.probe(node.key())
+        if entry is not None and entry.flag == EXACT and entry.depth >= depth:
+            node.score = entry.value
+            node.best_move = node.child_for(entry.best_move)
+            return node.score
+
     if depth == 0 or node.is_terminal():
-        node.score = evaluate_state(node)
+        node.score = leaf_value(node, stats, extension)
+        if scored is not None:
+            scored.add(node)
+        return node.score
+    if not node.children:  # Subtree cut off during generation, already scored
         return node.score
     
     if is_maximizing:
         best_score = -math.inf
-        for child in node.children:
-            score = minimax(child, depth - 1, False)
+        for divisor, child in zip([2, 3, 4], node.children):
+            score = minimax(child, depth - 1, False, table, stats, extension, scored, cancel_event)
             if score > best_score:
                 best_score = score
-                node.best_move = child
-        node.score = best_score
-        return best_score
+                best_divisor = divisor
     else:
         best_score = math.inf
-        for child in node.children:
-            score = minimax(child, depth - 1, True)
+        for divisor, child in zip([2, 3, 4], node.children):
+            score = minimax(child, depth - 1, True, table, stats, extension, scored, cancel_event)
             if score < best_score:
                 best_score = score
-                node.best_move = child
-        node.score = best_score
-        return best_score
+                best_divisor = divisor
+    node.score = best_score
+    node.best_move = node.child_for(best_divisor)
+    if scored is not None:
+        scored.add(node)
+    if table is not None:
+        table.store(node.key(), best_score, EXACT, depth, best_divisor)
+    return best_score
+
+#%% Vectorized Search
+# The full tree is a complete 3-ary tree, so each ply is held as flat NumPy
+# arrays: the children of entry i of a ply are entries 3i, 3i+1 and 3i+2 of
+# the next one. Terminal states are expanded like the others and their
+# children ignored when the values are backed up.
+
+def evaluate_states(numbers, player_scores, ai_scores, banks, is_player_turn):
+    """evaluate_state over arrays of states that all have the same side to move"""
+    number_factor = (100 - numbers) * np.where(numbers < 50, 3, 1) * np.where(numbers < 20, 5, 1)
+    bank_bonus = np.where(numbers % 5 == 0, 100, 0)
+    if is_player_turn:
+        scores = number_factor * 0.5 - player_scores * 80 + ai_scores * 100 + bank_bonus * 0.5
+    else:
+        scores = number_factor - player_scores * 100 + ai_scores * 120 + bank_bonus
+    scores = scores + banks * 40
+    for divisor in [2, 3, 4]:
+        new_numbers = np.rint(numbers / divisor)  # Rounds half to even, like round()
+        if is_player_turn:
+            scores = scores + np.where(new_numbers <= 10, -500, np.where(new_numbers % 2 == 1, -60, 0))
+        else:
+            scores = scores + np.where(new_numbers <= 10, 500, np.where(new_numbers % 2 == 0, 30, 0))
+    return np.where(numbers <= 10, -10000 if is_player_turn else 10000, scores)
+
+def vectorized_minimax(node, depth, is_maximizing, stats=None):
+    """Minimax over the full tree of `node`, expanded and backed up one ply at a time with NumPy
+
+    Plays the same moves as minimax on a generated tree. Sets node.score
+    and node.best_move and returns the score.
+    """
+    if np is None:
+        raise ImportError("vectorized_minimax needs NumPy")
+    numbers = np.array([node.number], dtype=np.int64)
+    player_scores = np.array([node.player_score], dtype=np.int64)
+    ai_scores = np.array([node.ai_score], dtype=np.int64)
+    banks = np.array([node.bank], dtype=np.int64)
+    is_player_turn = node.is_player_turn
+    plies = [numbers]
+    for _ in range(depth):
+        # Same rules as process_turn, for every child of the ply at once
+        numbers = np.rint(np.repeat(numbers, 3) / np.tile([2, 3, 4], len(numbers))).astype(np.int64)
+        gains = np.where(numbers % 2 == 1, 1, -1)
+        player_scores = np.repeat(player_scores, 3)
+        ai_scores = np.repeat(ai_scores, 3)
+        if is_player_turn:
+            player_scores = player_scores + gains
+        else:
+            ai_scores = ai_scores + gains
+        banks = np.repeat(banks, 3) + (numbers % 5 == 0)
+        is_player_turn = not is_player_turn
+        plies.append(numbers)
+    if stats is not None:
+        tree_size = sum(len(ply) for ply in plies)
+        stats.nodes += tree_size
+        stats.nodes_generated += tree_size - 1
+
+    start_time = time.perf_counter()
+    values = evaluate_states(numbers, player_scores, ai_scores, banks, is_player_turn)
+    if stats is not None:
+        stats.evaluation_time += time.perf_counter() - start_time
+        stats.evaluations += len(values)
+
+    # Back the values up: each ply takes the max or min of its children,
+    # except terminal states, which keep their own value
+    best_index = 0
+    for ply in range(depth - 1, -1, -1):
+        maximizing = is_maximizing != (ply % 2 == 1)
+        player_to_move = node.is_player_turn != (ply % 2 == 1)
+        children = values.reshape(-1, 3)
+        if ply == 0:
+            best_index = int(children[0].argmax() if maximizing else children[0].argmin())  # First best, like minimax
+        backed_up = children.max(axis=1) if maximizing else children.min(axis=1)
+        values = np.where(plies[ply] <= 10, -10000 if player_to_move else 10000, backed_up)
+
+    node.score = float(values[0])
+    if depth > 0 and not node.is_terminal():
+        node.best_move = make_move(node, best_index + 2)
+    return node.score
+
+#%% Move Ordering
+
+class MoveOrdering:
+    """Killer-move and history tables used to order alpha-beta's children
+
+    Keep one instance for a whole game: the tables carry over between the
+    searches of successive turns, with history halved at each new search.
+    """
+    def __init__(self):
+        self.killers = {}  # Remaining depth -> divisor that last caused a cutoff there
+        self.history = {}  # (is_maximizing, divisor) -> cutoff credit
+
+    def new_search(self):
+        """Age the history so recent cutoffs weigh more than old ones"""
+        for move in self.history:
+            self.history[move] //= 2
+
+    def order(self, moves, depth, is_maximizing, hash_move=None):
+        """Sort (divisor, child) pairs, most promising first
+
+        Table move first, then the killer for this depth, then history, then
+        the immediate score change for the side to move. Ties keep [2, 3, 4].
+        """
+        killer = self.killers.get(depth)
+        def priority(move):
+            divisor, child = move
+            gain = child.ai_score - child.player_score
+            return (divisor == hash_move, divisor == killer,
+                    self.history.get((is_maximizing, divisor), 0),
+                    gain if is_maximizing else -gain)
+        return sorted(moves, key=priority, reverse=True)
+
+    def record_cutoff(self, divisor, depth, is_maximizing):
+        """Credit a move that caused a cutoff"""
+        self.killers[depth] = divisor
+        move = (is_maximizing, divisor)
+        self.history[move] = self.history.get(move, 0) + depth * depth
+
+    def clear(self):
+        self.killers.clear()
+        self.history.clear()
 
 #%% Alpha-Beta
 
-def alpha_beta(node, depth, alpha, beta, is_maximizing):
-    """Alpha-Beta pruning algorithm implementation"""
+def alpha_beta(node, depth, alpha, beta, is_maximizing, table=None, ordering=None, stats=None, extension=None,
+               scored=None, cancel_event=None):
+    """Alpha-Beta pruning algorithm implementation
+
+    `scored` works as in minimax; only scores strictly inside the window,
+    which are exact, join it. Raises SearchTimeout once `cancel_event` is set.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchTimeout
+    if scored is not None and node in scored:
+        return node.score
+    if stats is not None:
+        stats.nodes += 1
+    original_alpha, original_beta = alpha, beta
+    hash_move = None
+    if table is not None:
+        entry = table.probe(node.key())
+        if entry is not None:
+            hash_move = entry.best_move
+        if entry is not None and entry.depth >= depth:
+            if entry.flag == EXACT:
+                alpha = beta = entry.value
+            elif entry.flag == LOWER_BOUND:
+                alpha = max(alpha, entry.value)
+            else:
+                beta = min(beta, entry.value)
+            if beta <= alpha:
+                node.score = entry.value
+                node.best_move = node.child_for(entry.best_move)
+                return node.score
+
     if depth == 0 or node.is_terminal():
-        node.score = evaluate_state(node)
+        node.score = leaf_value(node, stats, extension)
+        if scored is not None:
+            scored.add(node)
         return node.score
+    if not node.children:  # Subtree cut off during generation, already scored
+        return node.score
+
+    moves = list(zip([2, 3, 4], node.children))
+    if ordering is not None:
+        moves = ordering.order(moves, depth, is_maximizing, hash_move)
     
     if is_maximizing:
         best_score = -math.inf
-        for child in node.children:
-            score = alpha_beta(child, depth - 1, alpha, beta, False)
+        for divisor, child in moves:
+            score = alpha_beta(child, depth - 1, alpha, beta, False, table, ordering, stats, extension, scored,
+                               cancel_event)
             if score > best_score:
                 best_score = score
-                node.best_move = child
+                best_divisor = divisor
             alpha = max(alpha, best_score)
             if beta <= alpha:
                 break
-        node.score = best_score
-        return best_score
     else:
         best_score = math.inf
-        for child in node.children:
-            score = alpha_beta(child, depth - 1, alpha, beta, True)
+        for divisor, child in moves:
+            score = alpha_beta(child, depth - 1, alpha, beta, True, table, ordering, stats, extension, scored,
+                               cancel_event)
             if score < best_score:
                 best_score = score
-                node.best_move = child
+                best_divisor = divisor
             beta = min(beta, best_score)
             if beta <= alpha:
                 break
-        node.score = best_score
-        return best_score
+    if beta <= alpha:
+        if ordering is not None:
+            ordering.record_cutoff(divisor, depth, is_maximizing)
+        if stats is not None:
+            stats.record_cutoff(depth)
+    node.score = best_score
+    node.best_move = node.child_for(best_divisor)
+    if scored is not None and original_alpha < best_score < original_beta:
+        scored.add(node)
+    if table is not None:
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= original_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        table.store(node.key(), best_score, flag, depth, best_divisor)
+    return best_score
 
-#%% AI Decision Making
+#%% Tree-free Search
 
-def ai_choose_move(current_number, player_score, ai_score, bank, use_alpha_beta=False, max_depth=4):
-    """AI decision making function using either Minimax or Alpha-Beta"""
-    # Create the root node for the current game state
-    root = GameNode(current_number, player_score, ai_score, bank, False)  # False = AI's turn
-    
-    # Generate the game tree
-    start_tree_time = time.time()
-    generate_game_tree(root, 0, max_depth)
-    tree_generation_time = time.time() - start_tree_time
-    
-    # Apply the selected algorithm
-    start_algo_time = time.time()
-    if use_alpha_beta:
-        alpha_beta(root, max_depth, -math.inf, math.inf, True)
+class SearchTimeout(Exception):
+    """Raised inside a search once its deadline has passed or its cancel_event is set"""
+
+def minimax_search(node, depth, is_maximizing, table=None, deadline=None, stats=None, extension=None,
+                   cancel_event=None):
+    """Minimax that generates children on the fly instead of walking a prebuilt tree
+
+    Only the nodes on the current path and their best children stay in memory.
+    Raises SearchTimeout once time.perf_counter() passes `deadline` or
+    `cancel_event` is set.
+    """
+    if (deadline is not None and time.perf_counter() > deadline or
+            cancel_event is not None and cancel_event.is_set()):
+        raise SearchTimeout
+    if stats is not None:
+        stats.nodes += 1
+    if table is not None:
+        entry = table.probe(node.key())
+        if entry is not None and entry.flag == EXACT and entry.depth >= depth:
+            node.score = entry.value
+            node.best_move = make_move(node, entry.best_move) if entry.best_move else None
+            return node.score
+
+    if depth == 0 or node.is_terminal():
+        node.score = leaf_value(node, stats, extension)
+        return node.score
+
+    best_score = -math.inf if is_maximizing else math.inf
+    for divisor in [2, 3, 4]:
+        child = make_move(node, divisor)
+        if stats is not None:
+            stats.nodes_generated += 1
+        score = minimax_search(child, depth - 1, not is_maximizing, table, deadline, stats, extension, cancel_event)
+        if (score > best_score) if is_maximizing else (score < best_score):
+            best_score = score
+            best_divisor = divisor
+            node.best_move = child
+    node.score = best_score
+    if table is not None:
+        table.store(node.key(), best_score, EXACT, depth, best_divisor)
+    return best_score
+
+def alpha_beta_search(node, depth, alpha, beta, is_maximizing, table=None, deadline=None, ordering=None,
+                      stats=None, extension=None, cancel_event=None):
+    """Alpha-Beta that generates children on the fly, so pruned branches are never built
+
+    The best move stored in `table` by an earlier (shallower) search is tried
+    first. Raises SearchTimeout once time.perf_counter() passes `deadline` or
+    `cancel_event` is set.
+    """
+    if (deadline is not None and time.perf_counter() > deadline or
+            cancel_event is not None and cancel_event.is_set()):
+        raise SearchTimeout
+    if stats is not None:
+        stats.nodes += 1
+    original_alpha, original_beta = alpha, beta
+    hash_move = None
+    if table is not None:
+        entry = table.probe(node.key())
+        if entry is not None:
+            hash_move = entry.best_move
+        if entry is not None and entry.depth >= depth:
+            if entry.flag == EXACT:
+                alpha = beta = entry.value
+            elif entry.flag == LOWER_BOUND:
+                alpha = max(alpha, entry.value)
+            else:
+                beta = min(beta, entry.value)
+            if beta <= alpha:
+                node.score = entry.value
+                node.best_move = make_move(node, entry.best_move) if entry.best_move else None
+                return node.score
+
+    if depth == 0 or node.is_terminal():
+        node.score = leaf_value(node, stats, extension)
+        return node.score
+
+    if ordering is not None:
+        # The static ordering needs every child up front
+        moves = ordering.order([(divisor, make_move(node, divisor)) for divisor in [2, 3, 4]],
+                               depth, is_maximizing, hash_move)
+        if stats is not None:
+            stats.nodes_generated += 3
+    else:
+        divisors = [2, 3, 4]
+        if hash_move:
+            divisors.remove(hash_move)
+            divisors.insert(0, hash_move)
+        moves = [(divisor, None) for divisor in divisors]
+
+    best_score = -math.inf if is_maximizing else math.inf
+    for divisor, child in moves:
+        if child is None:
+            child = make_move(node, divisor)
+            if stats is not None:
+                stats.nodes_generated += 1
+        score = alpha_beta_search(child, depth - 1, alpha, beta, not is_maximizing, table, deadline, ordering, stats,
+                                  extension, cancel_event)
+        if is_maximizing:
+            if score > best_score:
+                best_score = score
+                best_divisor = divisor
+                node.best_move = child
+            alpha = max(alpha, best_score)
+        else:
+            if score < best_score:
+                best_score = score
+                best_divisor = divisor
+                node.best_move = child
+            beta = min(beta, best_score)
+        if beta <= alpha:
+            if ordering is not None:
+                ordering.record_cutoff(divisor, depth, is_maximizing)
+            if stats is not None:
+                stats.record_cutoff(depth)
+            break
+    node.score = best_score
+    if table is not None:
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= original_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        table.store(node.key(), best_score, flag, depth, best_divisor)
+    return best_score
+
+#%% Principal Variation Search
+
+NULL_WINDOW = 0.5  # evaluate_state scores are multiples of 0.5, so no score fits strictly inside
+
+def pvs_search(node, depth, alpha, beta, is_maximizing, table, deadline=None, ordering=None, stats=None,
+               extension=None, cancel_event=None):
+    """Principal Variation Search (NegaScout) on children generated on the fly
+
+    The first child is searched with the full window; the others only with a
+    null window proving they are no better, and are searched again with the
+    full window when that proof fails. Relies on `table` to make re-searches
+    cheap. Raises SearchTimeout once time.perf_counter() passes `deadline` or
+    `cancel_event` is set.
+    """
+    if (deadline is not None and time.perf_counter() > deadline or
+            cancel_event is not None and cancel_event.is_set()):
+        raise SearchTimeout
+    if stats is not None:
+        stats.nodes += 1
+    original_alpha, original_beta = alpha, beta
+    entry = table.probe(node.key())
+    hash_move = entry.best_move if entry is not None else None
+    if entry is not None and entry.depth >= depth:
+        if entry.flag == EXACT:
+            alpha = beta = entry.value
+        elif entry.flag == LOWER_BOUND:
+            alpha = max(alpha, entry.value)
+        else:
+            beta = min(beta, entry.value)
+        if beta <= alpha:
+            node.score = entry.value
+            node.best_move = make_move(node, entry.best_move) if entry.best_move else None
+            return node.score
+
+    if depth == 0 or node.is_terminal():
+        node.score = leaf_value(node, stats, extension)
+        return node.score
+
+    if ordering is not None:
+        # The static ordering needs every child up front
+        moves = ordering.order([(divisor, make_move(node, divisor)) for divisor in [2, 3, 4]],
+                               depth, is_maximizing, hash_move)
+        if stats is not None:
+            stats.nodes_generated += 3
+    else:
+        divisors = [2, 3, 4]
+        if hash_move:
+            divisors.remove(hash_move)
+            divisors.insert(0, hash_move)
+        moves = [(divisor, None) for divisor in divisors]
+
+    best_score = -math.inf if is_maximizing else math.inf
+    for index, (divisor, child) in enumerate(moves):
+        if child is None:
+            child = make_move(node, divisor)
+            if stats is not None:
+                stats.nodes_generated += 1
+        if index == 0:
+            score = pvs_search(child, depth - 1, alpha, beta, not is_maximizing, table, deadline, ordering, stats,
+                               extension, cancel_event)
+        elif is_maximizing:
+            score = pvs_search(child, depth - 1, alpha, alpha + NULL_WINDOW, False, table, deadline, ordering, stats,
+                               extension, cancel_event)
+            if alpha < score < beta:
+                score = pvs_search(child, depth - 1, alpha, beta, False, table, deadline, ordering, stats,
+                                   extension, cancel_event)
+        else:
+            score = pvs_search(child, depth - 1, beta - NULL_WINDOW, beta, True, table, deadline, ordering, stats,
+                               extension, cancel_event)
+            if alpha < score < beta:
+                score = pvs_search(child, depth - 1, alpha, beta, True, table, deadline, ordering, stats,
+                                   extension, cancel_event)
+        if is_maximizing:
+            if score > best_score:
+                best_score = score
+                best_divisor = divisor
+                node.best_move = child
+            alpha = max(alpha, best_score)
+        else:
+            if score < best_score:
+                best_score = score
+                best_divisor = divisor
+                node.best_move = child
+            beta = min(beta, best_score)
+        if beta <= alpha:
+            if ordering is not None:
+                ordering.record_cutoff(divisor, depth, is_maximizing)
+            if stats is not None:
+                stats.record_cutoff(depth)
+            break
+    node.score = best_score
+    if best_score <= original_alpha:
+        flag = UPPER_BOUND
+    elif best_score >= original_beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    table.store(node.key(), best_score, flag, depth, best_divisor)
+    return best_score
+
+#%% Iterative Deepening
+
+MAX_ITERATIVE_DEPTH = 20  # Safety cap, games never last this many plies
+
+@lru_cache(maxsize=None)
+def plies_to_end(number):
+    """Number of plies in the longest possible rest of the game from `number`"""
+    if number <= 10:
+        return 0
+    return 1 + max(plies_to_end(round(number / divisor)) for divisor in [2, 3, 4])
+
+def iterative_deepening(root, time_budget, use_alpha_beta=True, table=None, ordering=None, stats=None,
+                        on_iteration=None, cancel_event=None, use_pvs=False, extension=None):
+    """Search `root` one ply deeper at a time until `time_budget` seconds run out
+
+    Each iteration starts from the best moves the previous one left in the
+    transposition table. Returns (best_move, depth) of the deepest completed
+    iteration; depth 1 always completes. `on_iteration(depth, best_move, score)`
+    is called after each completed iteration, and setting `cancel_event`
+    (a threading.Event) abandons the running iteration after depth 1.
+    An EndgameExtension is passed on to every iteration's search.
+    """
+    if table is None:
+        table = TranspositionTable()
+    deadline = time.perf_counter() + time_budget
+    best_move, completed_depth = None, 0
+    # Searching past the end of the longest line cannot change the result
+    for depth in range(1, max(1, min(plies_to_end(root.number), MAX_ITERATIVE_DEPTH)) + 1):
+        iteration_deadline = deadline if depth > 1 else None
+        iteration_cancel_event = cancel_event if depth > 1 else None
+        if stats is not None:
+            # Cutoffs per ply are kept for the deepest completed iteration only
+            completed_cutoffs, stats.cutoffs_by_depth = stats.cutoffs_by_depth, {}
+        try:
+            if use_pvs:
+                pvs_search(root, depth, -math.inf, math.inf, not root.is_player_turn, table,
+                           iteration_deadline, ordering, stats, extension, iteration_cancel_event)
+            elif use_alpha_beta:
+                alpha_beta_search(root, depth, -math.inf, math.inf, not root.is_player_turn, table,
+                                  iteration_deadline, ordering, stats, extension, iteration_cancel_event)
+            else:
+                minimax_search(root, depth, not root.is_player_turn, table, iteration_deadline, stats, extension,
+                               iteration_cancel_event)
+        except SearchTimeout:
+            if stats is not None:
+                stats.cutoffs_by_depth = completed_cutoffs
+            break
+        best_move, completed_depth = root.best_move, depth
+        if stats is not None:
+            stats.search_depth = depth
+        if on_iteration is not None:
+            on_iteration(depth, best_move, root.score)
+        if time.perf_counter() > deadline or cancel_event is not None and cancel_event.is_set():
+            break
+    return best_move, completed_depth
+
+#%% Parallel Search
+# The tree is split a few plies below the root and every subtree at the split
+# ply is searched exactly in its own process. The split plies are then backed
+# up with the same [2, 3, 4] tie-breaking as the serial searches, so the move
+# found is the one minimax would play at that depth.
+
+PARALLEL_SPLIT_PLIES = 2  # 9 subtrees, enough to keep a few cores busy
+PARALLEL_CANCEL_POLL = 0.01  # Seconds between checks of cancel_event while the workers search
+
+_search_pool = None
+_search_pool_workers = None
+
+def get_search_pool(workers=None):
+    """Process pool shared by the parallel searches, created on first use"""
+    global _search_pool, _search_pool_workers
+    if _search_pool is None or workers != _search_pool_workers:
+        if _search_pool is not None:
+            _search_pool.shutdown(wait=False)
+        _search_pool = ProcessPoolExecutor(max_workers=workers)
+        _search_pool_workers = workers
+    return _search_pool
+
+def _search_subtree(task):
+    """Worker side of parallel_search: exact value of one subtree and the search counters"""
+    state, depth, is_maximizing, algorithm, extension = task
+    node = GameNode(*decode_state(state))
+    stats = SearchStats()
+    if extension is not None:
+        extension.new_search()  # The worker's own copy, with the whole budget for this subtree
+    if algorithm == "minimax":
+        score = minimax_search(node, depth, is_maximizing, TranspositionTable(), None, stats, extension)
+    elif algorithm == "pvs":
+        score = pvs_search(node, depth, -math.inf, math.inf, is_maximizing, TranspositionTable(), None,
+                           MoveOrdering(), stats, extension)
     else:
-        minimax(root, max_depth, True)
-    algo_time = time.time() - start_algo_time
+        score = alpha_beta_search(node, depth, -math.inf, math.inf, is_maximizing, TranspositionTable(), None,
+                                  MoveOrdering(), stats, extension)
+    return score, stats.nodes, stats.nodes_generated, stats.evaluations, stats.cutoffs, stats.extended_leaves
+
+def _split(node, plies, depth, is_maximizing, tasks):
+    """Expand `node` for `plies` plies, collecting the (state, depth, is_maximizing) of each subtree below"""
+    if plies == 0 or depth == 0 or node.is_terminal():
+        tasks[(node.key(), depth, is_maximizing)] = None
+        return
+    node.children = [make_move(node, divisor) for divisor in [2, 3, 4]]
+    for child in node.children:
+        _split(child, plies - 1, depth - 1, not is_maximizing, tasks)
+
+def _back_up(node, plies, depth, is_maximizing, values):
+    """Minimax over the split plies, from the subtree values the workers returned"""
+    if plies == 0 or depth == 0 or node.is_terminal():
+        node.score = values[(node.key(), depth, is_maximizing)]
+        return node.score
+    best_score = -math.inf if is_maximizing else math.inf
+    for child in node.children:
+        score = _back_up(child, plies - 1, depth - 1, not is_maximizing, values)
+        if score > best_score if is_maximizing else score < best_score:
+            best_score = score
+            node.best_move = child
+    node.score = best_score
+    return best_score
+
+def parallel_search(root, depth, is_maximizing, workers=None, stats=None, split_plies=PARALLEL_SPLIT_PLIES,
+                    algorithm="alphabeta", extension=None, cancel_event=None):
+    """Search `root` to `depth` with the subtrees `split_plies` below it spread over `workers` processes
+
+    Returns the exact minimax value of `root` and sets root.best_move.
+    Transposed subtrees at the split ply are searched once, each by
+    `algorithm` ("minimax", "alphabeta" or "pvs"; all give the same value).
+    An EndgameExtension is copied to every subtree, each with its own budget.
+    Raises SearchTimeout once `cancel_event` is set; subtrees already being
+    searched then finish in the background.
+    """
+    # Split the root at least, and leave the workers a ply to search when possible
+    plies = max(1, min(split_plies, depth - 1))
+    tasks = {}
+    _split(root, plies, depth, is_maximizing, tasks)
+    pool = get_search_pool(workers)
+    pending = {pool.submit(_search_subtree, task + (algorithm, extension)): task for task in tasks}
+    values = {}
+    while pending:
+        done, _ = wait(pending, PARALLEL_CANCEL_POLL if cancel_event is not None else None, FIRST_COMPLETED)
+        if cancel_event is not None and cancel_event.is_set():
+            for future in pending:
+                future.cancel()
+            raise SearchTimeout
+        for future in done:
+            score, nodes, nodes_generated, evaluations, cutoffs, extended_leaves = future.result()
+            values[pending.pop(future)] = score
+            if stats is not None:
+                stats.nodes += nodes
+                stats.nodes_generated += nodes_generated
+                stats.evaluations += evaluations
+                stats.cutoffs += cutoffs
+                stats.extended_leaves += extended_leaves
+    return _back_up(root, plies, depth, is_maximizing, values)
+
+#%% Monte Carlo Tree Search
+# UCT guided by random playouts instead of evaluate_state. A game from the
+# opening lasts at most a dozen plies, so a playout to the end is cheap; each
+# new leaf is scored by a batch of playouts run side by side.
+
+class MCTSNode:
+    """Visit statistics of one state in the Monte Carlo tree"""
+    __slots__ = ("node", "children", "visits", "reward")
+
+    def __init__(self, node):
+        self.node = node  # GameNode holding the state
+        self.children = []  # MCTSNodes in [2, 3, 4] order once expanded
+        self.visits = 0
+        self.reward = 0.0  # Sum of the playout results, 1 = AI win, 0.5 = draw, 0 = AI loss
+
+def random_playouts(node, count, rng):
+    """Play `count` random games from `node` to the end in lockstep and return the AI's total reward"""
+    # All the games have the same side to move at every step, so only the
+    # AI's margin over the player and the bank are kept per game
+    numbers = [node.number] * count
+    margins = [node.ai_score - node.player_score] * count
+    banks = [node.bank] * count
+    ai_moved_last = [node.is_player_turn] * count
+    ai_to_move = not node.is_player_turn
+    active = list(range(count)) if node.number > 10 else []
+    while active:
+        points = 1 if ai_to_move else -1
+        for game in active:
+            number = round(numbers[game] / rng.choice((2, 3, 4)))
+            numbers[game] = number
+            margins[game] += points if number % 2 else -points
+            if number % 5 == 0:
+                banks[game] += 1
+            ai_moved_last[game] = ai_to_move
+        active = [game for game in active if numbers[game] > 10]
+        ai_to_move = not ai_to_move
+
+    # The player who made the last move takes the bank
+    reward = 0.0
+    for margin, bank, ai_last in zip(margins, banks, ai_moved_last):
+        margin += bank if ai_last else -bank
+        reward += 1.0 if margin > 0 else 0.5 if margin == 0 else 0.0
+    return reward
+
+class MonteCarloSearch:
+    """UCT search kept across turns, so the subtree of the position reached is reused
+
+    Each iteration walks down the tree by UCB1, expands the leaf it stops at
+    and scores one of its children with `batch_size` random playouts.
+    """
+    def __init__(self, iterations=2000, batch_size=8, exploration=math.sqrt(2), seed=None):
+        self.iterations = iterations
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root = None
+
+    def clear(self):
+        self.root = None
+
+    def fork(self):
+        """A search starting from this one's tree whose root moves independently of it"""
+        search = MonteCarloSearch(self.iterations, self.batch_size, self.exploration, self.rng.getrandbits(32))
+        search.root = self.root
+        return search
+
+    def reuse(self, node):
+        """Make the tree node of `node`'s state the root, if an earlier search reached it"""
+        key = node.key()
+        if self.root is not None and self.root.node.key() != key:
+            # The state two plies on is among the grandchildren
+            frontier = self.root.children + [grandchild for child in self.root.children
+                                             for grandchild in child.children]
+            self.root = next((candidate for candidate in frontier if candidate.node.key() == key), None)
+        if self.root is None:
+            self.root = MCTSNode(GameNode(*decode_state(key)))
+        return self.root
+
+    def select_child(self, parent):
+        """Child maximizing UCB1 for the side to move at `parent`, unvisited children first"""
+        log_visits = math.log(parent.visits)
+        ai_to_move = not parent.node.is_player_turn
+        best_child, best_value = None, -math.inf
+        for child in parent.children:
+            if child.visits == 0:
+                return child
+            mean = child.reward / child.visits
+            value = (mean if ai_to_move else 1 - mean) + self.exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best_child, best_value = child, value
+        return best_child
+
+    def search(self, node, time_budget=None, stats=None):
+        """Run the search from `node`'s state and return the child GameNode to play
+
+        Runs `iterations` iterations, or until `time_budget` seconds have
+        passed when it is given.
+        """
+        root = self.reuse(node)
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        iteration = 0
+        while iteration == 0 or (iteration < self.iterations if deadline is None else time.perf_counter() < deadline):
+            iteration += 1
+            path = [root]
+            current = root
+            while current.children:
+                current = self.select_child(current)
+                path.append(current)
+            if not current.node.is_terminal() and (current.visits > 0 or current is root):
+                current.children = [MCTSNode(make_move(current.node, divisor)) for divisor in [2, 3, 4]]
+                current = current.children[0]
+                path.append(current)
+                if stats is not None:
+                    stats.nodes_generated += 3
+            reward = random_playouts(current.node, self.batch_size, self.rng)
+            for tree_node in path:
+                tree_node.visits += self.batch_size
+                tree_node.reward += reward
+            if stats is not None:
+                stats.nodes += 1
+                stats.evaluations += self.batch_size
+                stats.search_depth = max(stats.search_depth, len(path) - 1)
+
+        # The most visited move is the most reliable one
+        best = max(root.children, key=lambda child: child.visits)
+        node.best_move = best.node
+        node.score = best.reward / best.visits
+        return best.node
+
+#%% Endgame Tablebase
+
+TABLEBASE_MAX_NUMBER = 1000  # ai_choose_move plays perfectly once the number is this small
+
+@lru_cache(maxsize=None)
+def solve_exact(number, bank):
+    """Solve the rest of the game exactly by memoized dynamic programming
+
+    Returns (margin, divisor): the final score difference the side to move
+    can force over its opponent from here on, and the divisor that forces it
+    (None once the game is over). Points already scored only shift the final
+    difference, so the number and the bank are the whole key and both sides
+    share the same entries.
+    """
+    if number <= 10:
+        return -bank, None  # The opponent made the last move and takes the bank
+
+    best_margin, best_divisor = -math.inf, None
+    for divisor in [2, 3, 4]:
+        new_number, gain, new_bank = process_turn(round(number / divisor), 0, bank)
+        margin = gain - solve_exact(new_number, new_bank)[0]
+        if margin > best_margin:
+            best_margin, best_divisor = margin, divisor
+    return best_margin, best_divisor
+
+def exact_value(node):
+    """Final AI score minus player score when both sides play perfectly from `node`"""
+    margin = solve_exact(node.number, node.bank)[0]
+    score_difference = node.ai_score - node.player_score
+    return score_difference - margin if node.is_player_turn else score_difference + margin
+
+#%% Endgame Extension
+# A depth-limited search judges its leaves with evaluate_state, which only
+# guesses at the end of the game even when a few plies are left. With an
+# EndgameExtension the search goes on to the true terminal states below
+# leaves whose number is small: the leaf gets the final score difference of
+# the rest of the game played out exactly, put on evaluate_state's scale.
+
+EXTENSION_NUMBER = 300  # Leaves below this are played out, at most 5 more plies
+EXTENSION_BUDGET = 2000  # States solve_exact may newly expand during one search (a few ms)
+OUTCOME_SCORE = 10000  # Score of a won game, as evaluate_state gives terminal states
+
+def outcome_score(difference):
+    """Search score of a game ending with this final AI score minus player score"""
+    if difference == 0:
+        return 0
+    return difference + (OUTCOME_SCORE if difference > 0 else -OUTCOME_SCORE)
+
+class EndgameExtension:
+    """Selective extension of a search's leaves to the end of the game
+
+    Leaves below `below` and terminal states are scored by outcome_score of
+    exact_value. Extending costs nothing for states solve_exact has already
+    seen; once `budget` new states have been solved in the current search,
+    the remaining leaves fall back to evaluate_state. Keep one instance
+    for a whole game and let ai_choose_move start each search.
+    """
+    def __init__(self, below=EXTENSION_NUMBER, budget=EXTENSION_BUDGET):
+        self.below = below
+        self.budget = budget
+        self.spent = 0  # States solved by the current search
+
+    def new_search(self):
+        self.spent = 0
+
+    def evaluate(self, node, stats=None):
+        """Score of a search leaf, played out exactly when the extension applies"""
+        if not node.is_terminal() and (node.number >= self.below or self.spent >= self.budget):
+            return evaluate_state(node) if stats is None else stats.evaluate(node)
+        solved_before = solve_exact.cache_info().misses
+        score = outcome_score(exact_value(node))
+        self.spent += solve_exact.cache_info().misses - solved_before
+        if stats is not None:
+            stats.extended_leaves += 1
+        return score
+
+def leaf_value(node, stats=None, extension=None):
+    """Score of a search leaf: evaluate_state, or the extension's score when one is passed"""
+    if extension is not None:
+        return extension.evaluate(node, stats)
+    return evaluate_state(node) if stats is None else stats.evaluate(node)
+
+#%% Opening Book
+
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+BOOK_MAX_NUMBER = 30000  # Largest starting number produced by generate_initial_numbers
+BOOK_MAX_BANK = 15  # The bank never exceeds 11 in games starting at 30000 or less
+
+class OpeningBook:
+    """Read-only, memory-mapped file holding solve_exact for every number and bank
+
+    The file is a small header followed by one 2-byte record (signed margin,
+    best divisor) per state, stored at index `number * (max_bank + 1) + bank`.
+    Pages are loaded on demand and shared between processes by the OS.
+    """
+    HEADER = struct.Struct("<4sHHI")  # Magic, format version, max bank, max number
+    RECORD = struct.Struct("<bB")
+    MAGIC = b"RTUB"
+    VERSION = 1
+
+    def __init__(self, path=OPENING_BOOK_PATH):
+        with open(path, "rb") as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_bank, self.max_number = self.HEADER.unpack_from(self.data)
+        expected_size = self.HEADER.size + self.RECORD.size * (self.max_number + 1) * (self.max_bank + 1)
+        if magic != self.MAGIC or version != self.VERSION or len(self.data) != expected_size:
+            self.data.close()
+            raise ValueError(f"{path} is not a valid opening book, rebuild it with build_opening_book.py")
+
+    def lookup(self, number, bank):
+        """Return (margin, divisor) like solve_exact, or None if the state is not in the book"""
+        if not (10 < number <= self.max_number and 0 <= bank <= self.max_bank):
+            return None
+        offset = self.HEADER.size + self.RECORD.size * (number * (self.max_bank + 1) + bank)
+        return self.RECORD.unpack_from(self.data, offset)
+
+    def close(self):
+        self.data.close()
+
+def write_opening_book(path=OPENING_BOOK_PATH, max_number=BOOK_MAX_NUMBER, max_bank=BOOK_MAX_BANK):
+    """Solve every state up to `max_number` and write the opening book file"""
+    records = bytearray(OpeningBook.RECORD.size * (max_number + 1) * (max_bank + 1))
+    offset = 0
+    for number in range(max_number + 1):
+        for bank in range(max_bank + 1):
+            margin, divisor = solve_exact(number, bank) if number > 10 else (-bank, None)
+            OpeningBook.RECORD.pack_into(records, offset, margin, divisor or 0)
+            offset += OpeningBook.RECORD.size
+
+    # Write next to the target and swap it in, so readers never see a partial file
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as book_file:
+        book_file.write(OpeningBook.HEADER.pack(OpeningBook.MAGIC, OpeningBook.VERSION, max_bank, max_number))
+        book_file.write(records)
+    os.replace(temporary_path, path)
+
+_opening_book = None
+
+def get_opening_book(path=OPENING_BOOK_PATH):
+    """Open the opening book on first use; return None if it has not been built"""
+    global _opening_book
+    if _opening_book is None:
+        _opening_book = OpeningBook(path) if os.path.exists(path) else False
+    return _opening_book or None
+
+#%% AI Decision Making
+
+def play_exact(root, use_book=True):
+    """Set root.best_move and root.score from the opening book or the tablebase
+
+    Returns "opening book" or "tablebase", or None when neither covers the state
+    (always None once the game is over, there is no move to read).
+    With `use_book=False` only the tablebase is read.
+    """
+    if root.is_terminal():
+        return None
+    book = get_opening_book() if use_book else None
+    solution = book.lookup(root.number, root.bank) if book else None
+    source = "opening book"
+    if solution is None and root.number <= TABLEBASE_MAX_NUMBER:
+        solution = solve_exact(root.number, root.bank)
+        source = "tablebase"
+    if solution is None or solution[1] is None:
+        return None
+    root.best_move = make_move(root, solution[1])
+    root.score = root.ai_score - root.player_score + solution[0]
+    return source
+
+
+def ai_choose_move(current_number, player_score, ai_score, bank, use_alpha_beta=False, max_depth=4, table=None,
+                   lazy=False, compact=False, use_tablebase=True, time_budget_ms=None, ordering=None,
+                   stats=None, on_iteration=None, cancel_event=None, use_pvs=False, parallel_workers=None,
+                   mcts=None, tree=None, vectorized=False, extension=None, use_book=True):
+    """AI decision making function using Minimax, Alpha-Beta or Principal Variation Search
+
+    Returns (best_move, thinking_time, stats). The search fills in the node,
+    evaluation and cutoff counters of `stats` only when a SearchStats is
+    passed in or a hook is subscribed, as counting and timing every leaf
+    slows it down; otherwise a new SearchStats with only the times, the
+    depth and the source of the move is returned.
+
+    Passing a TranspositionTable shares search results between transposed
+    states and across the turns of a game. With `lazy=True` no tree is built:
+    children are generated inside the search and dropped once searched.
+    With `compact=True` the tree is stored in a GameTree instead of GameNodes.
+    Once the number is at most TABLEBASE_MAX_NUMBER, or whenever the opening
+    book file has been built, the move is read from the exact solution
+    instead (unless `use_tablebase` is False). `use_book=False` keeps the
+    tablebase but leaves the opening book out, so the search plays the opening.
+    With `time_budget_ms` set, `max_depth` is ignored: the tree-free search
+    deepens iteratively and returns the deepest result found in the budget;
+    `on_iteration` and `cancel_event` are passed on to iterative_deepening.
+    Setting `cancel_event` (a threading.Event) abandons a fixed-depth
+    search, checked at every node, and the move returned is then None.
+    A MoveOrdering kept across turns orders alpha-beta's children.
+    `use_pvs=True` selects the tree-free pvs_search over `use_alpha_beta`.
+    With `parallel_workers` set, a fixed-depth search is split over that many
+    processes instead, each searching its subtrees with the algorithm chosen
+    by `use_pvs` and `use_alpha_beta`; it plays the same move as serial minimax.
+    Passing a MonteCarloSearch plays by MCTS instead, for its number of
+    iterations or for `time_budget_ms`, reusing its tree from the last turn.
+    Passing a ReusableTree keeps the generated tree between turns: the next
+    search starts from the node of the new state and only adds missing plies.
+    With `vectorized=True` the full tree is searched by vectorized_minimax
+    (needs NumPy), which plays the same moves as minimax.
+    Passing an EndgameExtension plays out the small-number leaves of the
+    Minimax, Alpha-Beta, PVS and parallel searches to the end of the game;
+    the vectorized and MCTS searches do not use it.
+
+    When several options apply, the first of these picks the move: the
+    opening book, then the tablebase; a MonteCarloSearch; `time_budget_ms`;
+    `parallel_workers`; `vectorized`; `use_pvs`; then the tree searches
+    (`lazy` over `compact` over `tree`, with `use_alpha_beta` or Minimax).
+    """
+    counted = stats is not None or bool(_search_stats_hooks)
+    if stats is None:
+        stats = SearchStats()
+    if ordering is not None:
+        ordering.new_search()
+    if extension is not None:
+        extension.new_search()
+    if table is not None:
+        probes_before, hits_before = table.probes, table.hits
+    best_move = _choose_move(current_number, player_score, ai_score, bank, use_alpha_beta, max_depth, table,
+                             lazy, compact, use_tablebase, time_budget_ms, ordering, stats, counted, on_iteration,
+                             cancel_event, use_pvs, parallel_workers, mcts, tree, vectorized, extension,
+                             use_book)
+    if table is not None:
+        stats.table_probes += table.probes - probes_before
+        stats.table_hits += table.hits - hits_before
+    for callback in list(_search_stats_hooks):
+        callback(stats)
+    return best_move, stats.total_time, stats
+
+def _choose_move(current_number, player_score, ai_score, bank, use_alpha_beta, max_depth, table, lazy, compact,
+                 use_tablebase, time_budget_ms, ordering, stats, counted, on_iteration, cancel_event, use_pvs,
+                 parallel_workers, mcts, tree, vectorized, extension, use_book):
+    """Body of ai_choose_move: find the move and fill in `stats`, its counters too if `counted`"""
+    # The searches count into `search_stats`; the times, depth and source always go to `stats`
+    search_stats = stats if counted else None
+    if use_tablebase:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        source = play_exact(root, use_book)
+        if source is not None:
+            stats.source = source
+            stats.search_time += time.perf_counter() - start_time
+            return root.best_move
+
+    if mcts is not None:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        time_budget = time_budget_ms / 1000 if time_budget_ms is not None else None
+        best_move = mcts.search(root, time_budget, search_stats)
+        stats.search_time += time.perf_counter() - start_time
+        return best_move
+
+    if time_budget_ms is not None:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        best_move, stats.search_depth = iterative_deepening(root, time_budget_ms / 1000, use_alpha_beta, table,
+                                                            ordering, search_stats, on_iteration, cancel_event,
+                                                            use_pvs, extension)
+        stats.search_time += time.perf_counter() - start_time
+        return best_move
+
+    stats.search_depth = max_depth
+    if parallel_workers:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        algorithm = "pvs" if use_pvs else "alphabeta" if use_alpha_beta else "minimax"
+        try:
+            parallel_search(root, max_depth, True, parallel_workers, search_stats, algorithm=algorithm,
+                            extension=extension, cancel_event=cancel_event)
+        except SearchTimeout:  # cancel_event was set
+            return None
+        finally:
+            stats.search_time += time.perf_counter() - start_time
+        return root.best_move
+
+    if vectorized:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        vectorized_minimax(root, max_depth, True, search_stats)
+        stats.search_time += time.perf_counter() - start_time
+        return root.best_move
+
+    if use_pvs:
+        start_time = time.perf_counter()
+        root = GameNode(current_number, player_score, ai_score, bank, False)
+        try:
+            pvs_search(root, max_depth, -math.inf, math.inf, True,
+                       table if table is not None else TranspositionTable(), None, ordering, search_stats,
+                       extension, cancel_event)
+        except SearchTimeout:  # cancel_event was set
+            return None
+        finally:
+            stats.search_time += time.perf_counter() - start_time
+        return root.best_move
+
+    try:
+        # Create the root node for the current game state
+        start_tree_time = time.perf_counter()
+        if compact and not lazy:
+            root = GameTree(current_number, player_score, ai_score, bank, False,
+                            max_depth).build(table, search_stats, cancel_event).root
+        elif tree is not None and not lazy:
+            root = tree.reroot(current_number, player_score, ai_score, bank, False)
+            if search_stats is not None:  # Walks the whole kept subtree
+                stats.nodes_reused = count_nodes(root) - 1
+        else:
+            root = GameNode(current_number, player_score, ai_score, bank, False)  # False = AI's turn
+        
+        # Generate the game tree
+        if not lazy and not compact:
+            generate_game_tree(root, 0, max_depth, table, None, search_stats, extension, None, cancel_event)
+        stats.tree_generation_time += time.perf_counter() - start_tree_time
+        
+        # Apply the selected algorithm
+        start_algo_time = time.perf_counter()
+        if lazy and use_alpha_beta:
+            alpha_beta_search(root, max_depth, -math.inf, math.inf, True, table, None, ordering, search_stats,
+                              extension, cancel_event)
+        elif lazy:
+            minimax_search(root, max_depth, True, table, None, search_stats, extension, cancel_event)
+        elif use_alpha_beta:
+            alpha_beta(root, max_depth, -math.inf, math.inf, True, table, ordering, search_stats, extension, None,
+                       cancel_event)
+        else:
+            minimax(root, max_depth, True, table, search_stats, extension, None, cancel_event)
+        stats.search_time += time.perf_counter() - start_algo_time
+    except SearchTimeout:  # cancel_event was set
+        if tree is not None:
+            tree.clear()  # Generation may have stopped halfway through a node's children
+        return None
     
     # Get the best move from the root node
     if root.best_move:
-        return root.best_move, tree_generation_time + algo_time
+        return root.best_move
     else:
         # Fallback si aucun meilleur mouvement n'est trouvé (ne devrait pas arriver en jeu normal)
         divisor = random.choice([2, 3, 4])
         new_number = round(current_number / divisor)
         child = GameNode(new_number, player_score, ai_score, bank, True)
-        return child, 0.0
+        return child
+
+def ai_choose_moves(states, use_alpha_beta=False, max_depth=4, table=None, use_tablebase=True, stats=None,
+                    use_book=True):
+    """ai_choose_move for many games at once
+
+    `states` holds (current_number, player_score, ai_score, bank) tuples with
+    the AI to move. Returns (best_moves, thinking_time, stats) with one move
+    per state, in order. Identical states are searched once, and the trees of
+    all the games are generated as one graph: a subtree reached from several
+    games at the same depth is built, searched, and its leaves evaluated,
+    only once (alpha-beta searches it again where its score was only a bound).
+    Without `table` every game gets the move ai_choose_move would play; a
+    shared table also lets the games reuse each other's search results.
+    The counters of `stats` and `use_book` work as in ai_choose_move.
+    """
+    search_stats = stats if stats is not None or _search_stats_hooks else None
+    if stats is None:
+        stats = SearchStats()
+    if table is not None:
+        probes_before, hits_before = table.probes, table.hits
+    stats.search_depth = max_depth
+    roots = {}
+    for state in states:
+        root = GameNode(*state, False)
+        roots.setdefault(root.key(), root)
+
+    start_time = time.perf_counter()
+    to_search = [root for root in roots.values() if not (use_tablebase and play_exact(root, use_book))]
+    transpositions = {}  # Shared by all the trees, so common subtrees are generated once
+    scored = set()  # Shared too, so common subtrees are searched and their leaves evaluated once
+    for root in to_search:
+        generate_game_tree(root, 0, max_depth, table, transpositions, search_stats, None, scored)
+    stats.tree_generation_time += time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for root in to_search:
+        if use_alpha_beta:
+            alpha_beta(root, max_depth, -math.inf, math.inf, True, table, None, search_stats, None, scored)
+        else:
+            minimax(root, max_depth, True, table, search_stats, None, scored)
+    stats.search_time += time.perf_counter() - start_time
+
+    if table is not None:
+        stats.table_probes += table.probes - probes_before
+        stats.table_hits += table.hits - hits_before
+    for callback in list(_search_stats_hooks):
+        callback(stats)
+    return [roots[encode_state(*state, False)].best_move for state in states], stats.total_time, stats
+
+#%% Move Analysis
+
+ANALYSIS_TIME_BUDGET = 1.0  # Seconds spent deepening the analysis of one position
+ANALYSIS_CACHE_SIZE = 1000  # Positions whose analysis the GUI keeps
+
+def analyze_moves(current_number, player_score, ai_score, bank, time_budget=ANALYSIS_TIME_BUDGET, table=None,
+                  extension=None, on_result=None, cancel_event=None):
+    """Value and principal variation of each of the AI's three moves, one ply deeper at a time
+
+    Every depth searches the three moves in turn with alpha_beta_search, so
+    all of them are known to about the same depth when the budget runs out.
+    `on_result(divisor, depth, score, pv)` is called for each move searched,
+    pv starting with the divisor itself and read from `table`, so it goes on
+    through the states answered from the table. Returns {divisor: (depth, score, pv)}
+    for the deepest search of each move. Setting `cancel_event` stops the
+    analysis within the move being searched.
+    """
+    if table is None:
+        table = TranspositionTable()
+    if extension is not None:
+        extension.new_search()
+    root = GameNode(current_number, player_score, ai_score, bank, False)
+    children = {divisor: make_move(root, divisor) for divisor in [2, 3, 4]}
+    deadline = time.perf_counter() + time_budget
+    results = {}
+    for depth in range(1, max(1, min(plies_to_end(current_number), MAX_ITERATIVE_DEPTH)) + 1):
+        for divisor, child in children.items():
+            if cancel_event is not None and cancel_event.is_set():
+                return results
+            if child.is_terminal() and divisor in results:
+                continue  # Nothing left to search after a move that ends the game
+            try:
+                score = alpha_beta_search(child, depth - 1, -math.inf, math.inf, False, table,
+                                          deadline if depth > 1 else None, None, None, extension, cancel_event)
+            except SearchTimeout:
+                return results
+            results[divisor] = (depth, score, [divisor] + table.principal_variation(child, depth - 1))
+            if on_result is not None:
+                on_result(divisor, *results[divisor])
+        if time.perf_counter() > deadline:
+            break
+    return results
 
 #%% Game GUI
 class GameApp:
@@ -240,11 +1805,41 @@ class GameApp:
         self.current_number = 0
         self.player_turn = True
         self.use_alpha_beta = False
+        self.use_pvs = False
+        self.use_mcts = False
         self.numbers = []
         self.ai_last_move_time = 0
         self.first_player = "Player"  # Default first player
         self.game_over = False
         self.max_depth = 4  # Default search depth
+        self.time_budget_ms = None  # Per-move time budget, None = fixed depth
+        self.parallel_workers = None  # Processes for a fixed-depth search, None = serial
+        self.game_start = None  # Packed starting state of the game being played
+        self.game_moves = []  # Divisors played so far, for the game record
+        self.record_writer = None  # Opened with the first finished game
+        self.transposition_table = TranspositionTable()  # Search results shared across turns
+        self.move_ordering = MoveOrdering()  # Killer and history tables shared across turns
+        self.monte_carlo = MonteCarloSearch()  # Tree kept across turns when MCTS is selected
+        self.search_tree = ReusableTree()  # Minimax/Alpha-Beta tree kept across turns
+        self.endgame_extension = EndgameExtension()  # Used while Extend Endgames is checked
+        
+        # The AI searches on a worker thread so the window stays responsive
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.search_future = None
+        self.search_cancel_event = None
+        self.pending_ai_turn = None
+        self.ponder_searches = {}  # (state, settings) -> (AI search, its tree forks) started during the player's turn
+        
+        # The analysis panel searches on the AI's worker too: a second search
+        # thread would only share the interpreter with it and halve pondering
+        self.analysis_future = None
+        self.analysis_cancel_event = None
+        self.analysis_cache = OrderedDict()  # Packed state -> {divisor: (depth, score, pv)}, oldest first
+        self.analysis_complete = set()  # Packed states whose analysis used its whole time budget
+        self.analysis_table = TranspositionTable()  # From the player's point of view, unlike the AI's
+        self.analysis_extension = EndgameExtension()
+        self.analysis_frame = None
+        self.analysis_labels = {}  # Divisor -> label of the position on display
         
         # Create menu bar
         self.create_menu_bar()
@@ -262,7 +1857,8 @@ class GameApp:
         self.game_frame.pack(fill=tk.BOTH, expand=True)
         
         # AI thinking time label
-        self.ai_thinking_time_label = tk.Label(self.info_frame, text="AI Thinking Time: 0.00 seconds", font=("Arial", 12))
+        self.ai_thinking_time_label = tk.Label(self.info_frame, text="AI Thinking Time: 0.00 seconds", font=("Arial", 10),
+                                               justify=tk.LEFT, wraplength=460)
         self.ai_thinking_time_label.pack(pady=5, anchor=tk.W)
         
         # Algorithm label
@@ -294,6 +1890,30 @@ class GameApp:
         settings_menu.add_command(label="Choose Who Starts", command=self.choose_who_starts)
         settings_menu.add_command(label="Choose Algorithm", command=self.choose_algorithm)
         settings_menu.add_command(label="Set Search Depth", command=self.set_search_depth)
+        settings_menu.add_command(label="Set Time Budget", command=self.set_time_budget)
+        self.parallel_var = tk.BooleanVar(value=False)
+        settings_menu.add_checkbutton(label="Search on All Cores", variable=self.parallel_var,
+                                      command=self.toggle_parallel_search)
+        self.use_book_var = tk.BooleanVar(value=True)
+        settings_menu.add_checkbutton(label="Use Opening Book", variable=self.use_book_var)
+        self.extend_endgames_var = tk.BooleanVar(value=False)
+        settings_menu.add_checkbutton(label="Extend Endgames", variable=self.extend_endgames_var,
+                                      command=self.toggle_endgame_extension)
+        self.record_games_var = tk.BooleanVar(value=True)
+        settings_menu.add_checkbutton(label="Record Games", variable=self.record_games_var)
+        self.show_analysis_var = tk.BooleanVar(value=False)
+        settings_menu.add_checkbutton(label="Show Analysis", variable=self.show_analysis_var,
+                                      command=self.toggle_analysis)
+
+    def toggle_parallel_search(self):
+        """Spread fixed-depth searches over every core, or go back to a single one"""
+        self.parallel_workers = os.cpu_count() if self.parallel_var.get() else None
+
+    def toggle_endgame_extension(self):
+        """Play small-number leaves out to the end of the game, or go back to evaluate_state"""
+        # Scores stored with the other setting would mislead the next searches
+        self.transposition_table = TranspositionTable()
+        self.search_tree = ReusableTree()
 
     def choose_who_starts(self):
         """Dialog for choosing who starts the game"""
@@ -326,7 +1946,7 @@ class GameApp:
         """Dialog for choosing the AI algorithm"""
         dialog = tk.Toplevel(self.root)
         dialog.title("Choose AI Algorithm")
-        dialog.geometry("300x150")
+        dialog.geometry("540x150")
         dialog.resizable(False, False)
         dialog.transient(self.root)
         dialog.grab_set()
@@ -335,6 +1955,8 @@ class GameApp:
         
         def set_algorithm(choice):
             self.use_alpha_beta = (choice == "Alpha-Beta")
+            self.use_pvs = (choice == "PVS")
+            self.use_mcts = (choice == "MCTS")
             self.algorithm_label.config(text=f"Algorithm: {choice}")
             dialog.destroy()
         
@@ -348,6 +1970,14 @@ class GameApp:
         alpha_beta_button = tk.Button(button_frame, text="Alpha-Beta", font=("Arial", 12),
                                      width=10, command=lambda: set_algorithm("Alpha-Beta"))
         alpha_beta_button.pack(side=tk.LEFT, padx=10)
+        
+        pvs_button = tk.Button(button_frame, text="PVS", font=("Arial", 12),
+                              width=10, command=lambda: set_algorithm("PVS"))
+        pvs_button.pack(side=tk.LEFT, padx=10)
+        
+        mcts_button = tk.Button(button_frame, text="MCTS", font=("Arial", 12),
+                               width=10, command=lambda: set_algorithm("MCTS"))
+        mcts_button.pack(side=tk.LEFT, padx=10)
 
     def set_search_depth(self):
         """Dialog for setting the search depth"""
@@ -358,11 +1988,11 @@ class GameApp:
         dialog.transient(self.root)
         dialog.grab_set()
         
-        tk.Label(dialog, text="Set AI search depth (2-6):", font=("Arial", 12)).pack(pady=10)
+        tk.Label(dialog, text="Set AI search depth (2-10):", font=("Arial", 12)).pack(pady=10)
         
         depth_var = tk.IntVar(value=self.max_depth)
-        depth_scale = tk.Scale(dialog, from_=2, to=6, orient=tk.HORIZONTAL, 
-                              variable=depth_var, length=200, tickinterval=1)
+        depth_scale = tk.Scale(dialog, from_=2, to=10, orient=tk.HORIZONTAL, 
+                              variable=depth_var, length=200, tickinterval=2)
         depth_scale.pack(pady=5)
         
         def set_depth():
@@ -371,6 +2001,28 @@ class GameApp:
         
         tk.Button(dialog, text="Apply", font=("Arial", 12), command=set_depth).pack(pady=10)
 
+    def set_time_budget(self):
+        """Dialog for setting the AI time budget per move"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Set Time Budget")
+        dialog.geometry("300x170")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(dialog, text="AI time per move in ms (0 = fixed depth):", font=("Arial", 12)).pack(pady=10)
+        
+        budget_var = tk.IntVar(value=self.time_budget_ms or 0)
+        budget_scale = tk.Scale(dialog, from_=0, to=5000, resolution=100, orient=tk.HORIZONTAL,
+                               variable=budget_var, length=200)
+        budget_scale.pack(pady=5)
+        
+        def set_budget():
+            self.time_budget_ms = budget_var.get() or None
+            dialog.destroy()
+        
+        tk.Button(dialog, text="Apply", font=("Arial", 12), command=set_budget).pack(pady=10)
+
     def setup_new_game(self):
         """Set up a new game, clearing the previous game state"""
         # Reset game state
@@ -378,6 +2030,14 @@ class GameApp:
         self.ai_score = 0
         self.bank = 0
         self.game_over = False
+        self.cancel_ai_search()
+        self.stop_pondering()
+        self.cancel_analysis()
+        # Fresh tables, a cancelled search may still be finishing with the old ones
+        self.transposition_table = TranspositionTable()
+        self.move_ordering = MoveOrdering()
+        self.monte_carlo = MonteCarloSearch()
+        self.search_tree = ReusableTree()
         
         # Clear previous widgets
         for widget in self.game_frame.winfo_children():
@@ -429,6 +2089,8 @@ class GameApp:
             self.current_number = int(self.number_choice_var.get())
             self.player_turn = True
         # Si l'IA commence, on a déjà choisi un nombre aléatoire et défini player_turn à False
+        self.game_start = encode_state(self.current_number, 0, 0, 0, self.player_turn)
+        self.game_moves = []
         
         # Clear the game frame
         for widget in self.game_frame.winfo_children():
@@ -495,6 +2157,10 @@ class GameApp:
             info_text = f"Divide by {divisor}: {result:.2f} → {rounded}" + (" (exact)" if is_exact else " (rounded)")
             tk.Label(info_frame, text=info_text, font=("Arial", 11), anchor=tk.W).pack(anchor=tk.W, pady=2)
         
+        # Engine analysis of the three moves, filled in while Show Analysis is checked
+        self.analysis_frame = tk.Frame(parent_frame)
+        self.analysis_frame.pack(pady=5)
+        
         # Make move selection
         move_frame = tk.Frame(parent_frame)
         move_frame.pack(pady=10)
@@ -517,6 +2183,12 @@ class GameApp:
                  fg="white", 
                  padx=15, 
                  pady=5).pack(pady=10)
+        
+        # Use the time the player spends choosing to prepare the AI's replies
+        self.start_pondering()
+        # Queued behind the pondered searches on the same worker, so it never slows them down
+        if self.show_analysis_var.get():
+            self.start_analysis()
 
     def process_player_move(self):
         """Process the player's move"""
@@ -525,6 +2197,8 @@ class GameApp:
             return
             
         divisor = self.move_choice.get()
+        self.game_moves.append(divisor)
+        self.cancel_analysis()
         
         # Utiliser l'arrondi au lieu de la division entière
         self.current_number = round(self.current_number / divisor)
@@ -540,31 +2214,227 @@ class GameApp:
         self.status_label.config(text="Game Status: Active - AI's turn")
         self.update_game_display()
 
+    def toggle_analysis(self):
+        """Show or hide the analysis panel of the player's moves"""
+        if self.analysis_frame is None or not self.analysis_frame.winfo_exists():
+            return  # Not the player's turn, the panel appears with the next one
+        if self.show_analysis_var.get():
+            self.start_analysis()
+        else:
+            self.cancel_analysis()
+            for widget in self.analysis_frame.winfo_children():
+                widget.destroy()
+            self.analysis_labels = {}
+
+    def start_analysis(self):
+        """Show the cached analysis of the current position and deepen it in the background"""
+        self.cancel_analysis()
+        for widget in self.analysis_frame.winfo_children():
+            widget.destroy()
+        tk.Label(self.analysis_frame, text="Analysis (your point of view)",
+                 font=("Arial", 11, "bold")).pack(anchor=tk.W)
+        self.analysis_labels = {divisor: tk.Label(self.analysis_frame, text=f"Divide by {divisor}: ...",
+                                                  font=("Arial", 10), anchor=tk.W)
+                                for divisor in [2, 3, 4]}
+        for label in self.analysis_labels.values():
+            label.pack(anchor=tk.W)
+
+        key = encode_state(self.current_number, self.player_score, self.ai_score, self.bank, True)
+        if key in self.analysis_cache:
+            self.analysis_cache.move_to_end(key)
+            for divisor, result in self.analysis_cache[key].items():
+                self.show_analysis(divisor, *result)
+            if key in self.analysis_complete:
+                return
+        else:
+            self.analysis_cache[key] = {}
+            if len(self.analysis_cache) > ANALYSIS_CACHE_SIZE:
+                oldest, _ = self.analysis_cache.popitem(last=False)
+                self.analysis_complete.discard(oldest)
+
+        cancel_event = threading.Event()
+        results = queue.Queue()
+
+        def report_result(divisor, depth, score, pv):
+            # Called on the analysis thread: hand the result over to the Tk thread
+            results.put((divisor, depth, score, pv))
+
+        # The player's move is searched as the AI's, so the scores swap sides
+        future = self.search_executor.submit(
+            analyze_moves, self.current_number, self.ai_score, self.player_score, self.bank,
+            table=self.analysis_table, extension=self.analysis_extension, on_result=report_result,
+            cancel_event=cancel_event)
+        self.analysis_future, self.analysis_cancel_event = future, cancel_event
+        self.root.after(50, self.poll_analysis, future, cancel_event, results, key)
+
+    def poll_analysis(self, future, cancel_event, results, key):
+        """Cache the analysis results that arrived and show them if their position is on display"""
+        cached = self.analysis_cache.get(key)
+        while not results.empty():
+            divisor, depth, score, pv = results.get()
+            if cached is not None:
+                if depth < cached.get(divisor, (0,))[0]:
+                    continue  # A restarted analysis catching up with the cached one
+                # Results of a cancelled analysis are still right for their own position
+                cached[divisor] = (depth, score, pv)
+            if future is self.analysis_future:
+                self.show_analysis(divisor, depth, score, pv)
+
+        if not future.done():
+            self.root.after(50, self.poll_analysis, future, cancel_event, results, key)
+            return
+        if future is self.analysis_future:
+            self.analysis_future = None
+        if cached is not None and not cancel_event.is_set():
+            self.analysis_complete.add(key)
+
+    def show_analysis(self, divisor, depth, score, pv):
+        """Update the analysis line of one move"""
+        label = self.analysis_labels.get(divisor)
+        if label is None or not label.winfo_exists():
+            return
+        if abs(score) >= OUTCOME_SCORE - 100:  # A game played out to its end
+            margin = abs(score) - OUTCOME_SCORE
+            value = f"you win by {margin:.0f}" if score > 0 else f"you lose by {margin:.0f}"
+        else:
+            value = f"{score:+.0f}"
+        line = " ".join(f"÷{step}" for step in pv)
+        label.config(text=f"Divide by {divisor}: {value} (depth {depth}) {line}")
+
+    def cancel_analysis(self):
+        """Stop deepening the analysis on display, keeping what is already cached"""
+        if self.analysis_future is not None:
+            self.analysis_cancel_event.set()
+            self.analysis_future.cancel()
+            self.analysis_future = None
+
     def handle_ai_turn(self, parent_frame):
         """Handle the AI's turn"""
         tk.Label(parent_frame, text="AI's Turn", font=("Arial", 14, "bold")).pack(pady=5)
-        tk.Label(parent_frame, text="AI is thinking...", font=("Arial", 12)).pack(pady=5)
+        self.ai_progress_label = tk.Label(parent_frame, text="AI is thinking...", font=("Arial", 12))
+        self.ai_progress_label.pack(pady=5)
         
-        # Update UI first then process AI move after a brief delay
-        self.root.update()
-        self.root.after(100, self.process_ai_move)
+        # Let the UI draw first, then start the search in the background
+        self.pending_ai_turn = self.root.after(100, self.process_ai_move)
 
-    def process_ai_move(self):
-        """Process the AI's move using the selected algorithm"""
-        # AI decision making
-        result, thinking_time = ai_choose_move(
-            self.current_number, 
-            self.player_score,
-            self.ai_score,
-            self.bank,
+    def ai_search_settings(self):
+        """Settings a finished AI search depends on, besides the game state"""
+        return (self.use_alpha_beta, self.use_pvs, self.use_mcts, self.max_depth, self.time_budget_ms,
+                self.parallel_workers, self.extend_endgames_var.get(), self.use_book_var.get())
+
+    def submit_ai_search(self, number, player_score, ai_score, bank, tree, monte_carlo):
+        """Queue an AI search on the worker thread, returning (future, cancel_event, progress_updates)"""
+        cancel_event = threading.Event()
+        progress_updates = queue.Queue()
+        
+        def report_progress(depth, best_move, score):
+            # Called on the worker thread: hand the update over to the Tk thread
+            progress_updates.put((depth, score))
+        
+        future = self.search_executor.submit(
+            ai_choose_move,
+            number, 
+            player_score,
+            ai_score,
+            bank,
             self.use_alpha_beta,
-            self.max_depth
+            self.max_depth,
+            self.transposition_table,
+            time_budget_ms=self.time_budget_ms,
+            ordering=self.move_ordering,
+            stats=SearchStats(),  # Shown in full once the move is played
+            on_iteration=report_progress,
+            cancel_event=cancel_event,
+            use_pvs=self.use_pvs,
+            parallel_workers=self.parallel_workers,
+            mcts=monte_carlo if self.use_mcts else None,
+            tree=tree,
+            extension=self.endgame_extension if self.extend_endgames_var.get() else None,
+            use_book=self.use_book_var.get()
         )
+        return future, cancel_event, progress_updates
+
+    def start_pondering(self):
+        """Search the AI's reply to each of the player's three possible moves in the background"""
+        self.stop_pondering()
+        player_node = GameNode(self.current_number, self.player_score, self.ai_score, self.bank, True)
+        for divisor in [2, 3, 4]:
+            reply_state = make_move(player_node, divisor)
+            if reply_state.is_terminal():
+                continue
+            key = (reply_state.key(), self.ai_search_settings())
+            # Each reply reroots its own fork of the trees, so the three searches keep their subtrees
+            tree, monte_carlo = self.search_tree.fork(), self.monte_carlo.fork()
+            search = self.submit_ai_search(reply_state.number, reply_state.player_score, reply_state.ai_score,
+                                           reply_state.bank, tree, monte_carlo)
+            self.ponder_searches[key] = (search, tree, monte_carlo)
+
+    def stop_pondering(self):
+        """Discard every pondered search that has not been used"""
+        for (future, cancel_event, _), _, _ in self.ponder_searches.values():
+            cancel_event.set()
+            future.cancel()
+        self.ponder_searches.clear()
+
+    def process_ai_move(self):
+        """Play the AI's move, from the pondered search if there is one, else from a new search"""
+        self.pending_ai_turn = None
+        self.cancel_ai_search()
+        
+        # Keep the search for the branch the player chose and throw away the others
+        key = (encode_state(self.current_number, self.player_score, self.ai_score, self.bank, False),
+               self.ai_search_settings())
+        pondered = self.ponder_searches.pop(key, None)
+        self.stop_pondering()
+        
+        if pondered is None:
+            pondered = self.submit_ai_search(self.current_number, self.player_score, self.ai_score, self.bank,
+                                             self.search_tree, self.monte_carlo)
+        else:
+            # The forks of the branch actually played become the trees of the next turns
+            pondered, self.search_tree, self.monte_carlo = pondered
+        self.search_future, self.search_cancel_event, progress_updates = pondered
+        if self.search_future.done():
+            self.poll_ai_search(self.search_future, progress_updates)
+        else:
+            self.root.after(50, self.poll_ai_search, self.search_future, progress_updates)
+
+    def poll_ai_search(self, future, progress_updates):
+        """Show search progress and apply the AI's move once the worker is done"""
+        if future is not self.search_future:
+            return  # Cancelled or replaced by a newer search
+        
+        while not progress_updates.empty():
+            depth, score = progress_updates.get()
+            if self.ai_progress_label.winfo_exists():
+                self.ai_progress_label.config(text=f"AI is thinking... depth {depth} searched (score {score:.0f})")
+        
+        if not future.done():
+            self.root.after(50, self.poll_ai_search, future, progress_updates)
+            return
         
-        # Update the time display
-        self.ai_thinking_time_label.config(text=f"AI Thinking Time: {thinking_time:.2f} seconds")
+        self.search_future = None
+        result, thinking_time, stats = future.result()
+        self.apply_ai_move(result, stats)
+
+    def cancel_ai_search(self):
+        """Abandon the scheduled or running AI search, if any"""
+        if self.pending_ai_turn is not None:
+            self.root.after_cancel(self.pending_ai_turn)
+            self.pending_ai_turn = None
+        if self.search_future is not None:
+            self.search_cancel_event.set()
+            self.search_future.cancel()
+            self.search_future = None
+
+    def apply_ai_move(self, result, stats):
+        """Play the move chosen by the AI"""
+        # Update the search statistics display
+        self.ai_thinking_time_label.config(text=stats.summary())
         
         if result:
+            self.game_moves.append(divisor_played(self.current_number, result.number))
+            
             # Update game state
             self.current_number = result.number
             self.player_score = result.player_score
@@ -586,6 +2456,9 @@ class GameApp:
 
     def end_game(self):
         """Handle game over scenario"""
+        self.stop_pondering()
+        self.cancel_analysis()
+        self.record_game()
         for widget in self.game_frame.winfo_children():
             widget.destroy()
 
@@ -645,8 +2518,23 @@ class GameApp:
                  padx=20,
                  pady=10).pack(pady=20)
 
+    def record_game(self):
+        """Append the finished game to the game records file"""
+        if not self.record_games_var.get() or self.game_start is None:
+            return
+        if self.record_writer is None:
+            self.record_writer = GameRecordWriter()
+        self.record_writer.write(GameRecord(self.game_start, self.game_moves))
+        self.game_start = None  # end_game can be shown again for the same game
+
+    def close(self):
+        """Flush the game records before the program exits"""
+        if self.record_writer is not None:
+            self.record_writer.close()
+
 #%% Run the game
 if __name__ == "__main__":
     root = tk.Tk()
     app = GameApp(root)
     root.mainloop()
+    app.close()
@@ -0,0 +1,110 @@
+#%% Library import
+import random
+
+#%% Shared engine for the console games (minimax.py and aplhabeta.py)
+# A move divides the number exactly by 2, 3 or 4. The score of a position
+# only depends on the number and on who is maximizing, so exact scores are
+# memoized on (number, is_maximizing) and shared by both algorithms.
+
+_exact_scores = {}  # (number, is_maximizing) -> (best_score, best_move)
+
+def clear_cache():
+    _exact_scores.clear()
+
+# Points scored by the move that produces new_number
+def move_score(new_number):
+    temp_score = 1 if new_number % 2 != 0 else -1
+    if new_number % 10 == 0 or new_number % 10 == 5:
+        temp_score += 1
+    return temp_score
+
+def minimax(number, depth, is_maximizing):
+    """Return the best divider at depth 0, the position's score deeper down"""
+    best_score, best_move = _solve(number, is_maximizing)
+    return best_score if depth > 0 else best_move
+
+def _solve(number, is_maximizing):
+    if number <= 10:
+        return 0, None
+    key = (number, is_maximizing)
+    if key in _exact_scores:
+        return _exact_scores[key]
+
+    best_score = -float('inf') if is_maximizing else float('inf')
+    best_move = None
+    for move in [2, 3, 4]:
+        if number % move == 0:
+            new_number = number // move
+            score = move_score(new_number) + _solve(new_number, not is_maximizing)[0]
+            if (score > best_score) if is_maximizing else (score < best_score):
+                best_score = score
+                best_move = move
+
+    _exact_scores[key] = (best_score, best_move)
+    return best_score, best_move
+
+def alpha_beta(number, depth, alpha, beta, is_maximizing):
+    """Return the best divider at depth 0 (2 if none divides), the position's score deeper down"""
+    best_score, best_move = _alpha_beta(number, alpha, beta, is_maximizing)
+    if depth > 0:
+        return best_score
+    return best_move if best_move is not None else 2
+
+def _alpha_beta(number, alpha, beta, is_maximizing):
+    if number <= 10:
+        return 0, None
+    key = (number, is_maximizing)
+    if key in _exact_scores:
+        return _exact_scores[key]
+
+    original_alpha, original_beta = alpha, beta
+    best_score = -float('inf') if is_maximizing else float('inf')
+    best_move = None
+    for move in [2, 3, 4]:
+        if number % move == 0:
+            new_number = number // move
+            # The child window is shifted by the points of this move
+            temp_score = move_score(new_number)
+            score = temp_score + _alpha_beta(new_number, alpha - temp_score, beta - temp_score,
+                                             not is_maximizing)[0]
+
+            if is_maximizing:
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                alpha = max(alpha, best_score)
+            else:
+                if score < best_score:
+                    best_score = score
+                    best_move = move
+                beta = min(beta, best_score)
+
+            if beta <= alpha:
+                break
+
+    # Only a score strictly inside the window is exact, the others are bounds
+    if original_alpha < best_score < original_beta or best_move is None:
+        _exact_scores[key] = (best_score, best_move)
+    return best_score, best_move
+
+#%% Side functions
+
+# Function that generates the first number
+def generate_initial_numbers():
+    numbers = []
+    while len(numbers) < 5:
+        num = random.randint(20000, 30000)
+        if num % 2 == 0 and num % 3 == 0 and num % 4 == 0:
+            numbers.append(num)
+    return numbers
+
+# Function that follows the game's rules
+def process_turn(new_number, player_score, bank):
+    if new_number % 2 == 0:
+        player_score -= 1
+    else:
+        player_score += 1
+    if new_number % 10 == 0 or new_number % 10 == 5:
+        bank += 1
+
+    return new_number, player_score, bank
@@ -0,0 +1,166 @@
+#%% Library import
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+# Packed states and the game record format live apart from code.py, which
+# needs tkinter, so the console games can record their games too.
+from console_engine import process_turn
+
+#%% State Encoding
+# A full game state packs into one int, used as its key by the caches: the
+# number in the high bits, then both scores (offset to be non-negative), the
+# bank and the side to move. Numbers up to 30000 take 15 bits, so any state
+# of a real game fits in 33 bits. States with a field out of range, which
+# real games never reach, are kept as a plain tuple instead: still a valid
+# key, only larger, and never equal to a packed int.
+
+SCORE_BITS = 6
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)  # Scores from -32 to 31
+BANK_BITS = 5  # Banks from 0 to 31 (a game never puts more than 11 in it)
+
+def encode_state(number, player_score, ai_score, bank, is_player_turn):
+    """Pack a game state into a single int, or a tuple when a field is out of range"""
+    packed_player_score = player_score + SCORE_OFFSET
+    packed_ai_score = ai_score + SCORE_OFFSET
+    # A field out of its range (negative included) leaves bits above its width
+    if packed_player_score >> SCORE_BITS or packed_ai_score >> SCORE_BITS or bank >> BANK_BITS or number < 0:
+        return number, player_score, ai_score, bank, bool(is_player_turn)
+    return ((((number << SCORE_BITS | packed_player_score) << SCORE_BITS | packed_ai_score) << BANK_BITS | bank) << 1
+            | is_player_turn)
+
+def decode_state(key):
+    """Unpack an encode_state key into (number, player_score, ai_score, bank, is_player_turn)"""
+    if isinstance(key, tuple):
+        return key
+    is_player_turn = bool(key & 1)
+    key >>= 1
+    bank = key & ((1 << BANK_BITS) - 1)
+    key >>= BANK_BITS
+    ai_score = (key & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET
+    key >>= SCORE_BITS
+    player_score = (key & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET
+    return key >> SCORE_BITS, player_score, ai_score, bank, is_player_turn
+
+#%% Game Records
+
+GAME_RECORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_records.bin")
+
+class RecordState(namedtuple("RecordState", "number player_score ai_score bank is_player_turn")):
+    """A game state replayed from a record, with the attributes of a GameNode"""
+    __slots__ = ()
+
+    def play(self, divisor):
+        """The state reached by dividing the number by `divisor`"""
+        if self.is_player_turn:
+            number, player_score, bank = process_turn(round(self.number / divisor), self.player_score, self.bank)
+            return RecordState(number, player_score, self.ai_score, bank, False)
+        number, ai_score, bank = process_turn(round(self.number / divisor), self.ai_score, self.bank)
+        return RecordState(number, self.player_score, ai_score, bank, True)
+
+class GameRecord:
+    """One finished game: its starting state and the divisors played
+
+    Every later state follows from the moves through process_turn, so a record
+    takes RECORD_HEADER.size bytes plus one byte per move on disk.
+    """
+    __slots__ = ("start", "timestamp", "moves")
+    FILE_HEADER = struct.Struct("<4sH")  # Magic, format version
+    RECORD_HEADER = struct.Struct("<QIB")  # Starting state packed by encode_state, Unix time, move count
+    MAGIC = b"RTUG"
+    VERSION = 1
+
+    def __init__(self, start, moves, timestamp=None):
+        self.start = start
+        self.moves = bytes(moves)
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
+
+    def to_bytes(self):
+        return self.RECORD_HEADER.pack(self.start, self.timestamp, len(self.moves)) + self.moves
+
+    def states(self):
+        """Yield (state, divisor played) for every move, then (final state, None)"""
+        state = RecordState(*decode_state(self.start))
+        for divisor in self.moves:
+            yield state, divisor
+            state = state.play(divisor)
+        yield state, None
+
+    def final_scores(self):
+        """(player_score, ai_score) once the last mover has taken the bank"""
+        state = RecordState(*decode_state(self.start))
+        for divisor in self.moves:
+            state = state.play(divisor)
+        if state.is_player_turn:  # The AI made the last move
+            return state.player_score, state.ai_score + state.bank
+        return state.player_score + state.bank, state.ai_score
+
+class GameRecordWriter:
+    """Append-only writer of game records; the file is written by a background thread
+
+    write() only queues the record, so the game never waits on the disk.
+    Call close() (or use it as a context manager) to flush what is queued.
+    """
+    def __init__(self, path=GAME_RECORDS_PATH):
+        self.path = path
+        self.records = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="game-record-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        self.records.put(record.to_bytes())
+
+    def run(self):
+        with open(self.path, "ab") as record_file:
+            if record_file.tell() == 0:
+                record_file.write(GameRecord.FILE_HEADER.pack(GameRecord.MAGIC, GameRecord.VERSION))
+            while True:
+                # Write everything queued so far in one call
+                data = [self.records.get()]
+                while not self.records.empty():
+                    data.append(self.records.get_nowait())
+                done = data[-1] is None
+                record_file.write(b"".join(item for item in data if item is not None))
+                record_file.flush()
+                if done:
+                    return
+
+    def close(self):
+        """Write the queued records and stop the thread"""
+        if self.thread.is_alive():
+            self.records.put(None)
+            self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_game_records(path=GAME_RECORDS_PATH, buffer_size=1 << 20):
+    """Yield the GameRecords of a file one at a time, reading it in large blocks"""
+    header_size = GameRecord.RECORD_HEADER.size
+    unpack_header = GameRecord.RECORD_HEADER.unpack_from
+    with open(path, "rb") as record_file:
+        magic, version = GameRecord.FILE_HEADER.unpack(record_file.read(GameRecord.FILE_HEADER.size))
+        if magic != GameRecord.MAGIC or version != GameRecord.VERSION:
+            raise ValueError(f"{path} is not a game record file")
+        data, offset = b"", 0
+        while True:
+            block = record_file.read(buffer_size)
+            data = data[offset:] + block
+            offset = 0
+            while len(data) - offset >= header_size:
+                start, timestamp, move_count = unpack_header(data, offset)
+                end = offset + header_size + move_count
+                if end > len(data):
+                    break
+                yield GameRecord(start, data[offset + header_size:end], timestamp)
+                offset = end
+            if not block:
+                if offset < len(data):
+                    raise ValueError(f"{path} ends with a truncated record")
+                return
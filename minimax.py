@@ -1,60 +1,11 @@
 #%% Library import
-import random
-
-#%% Side functions
-
-def minimax(number, depth, is_maximizing):
-    if number <= 10:
-        return 0
-
-    dividers = [2, 3, 4]
-    best_score = -float('inf') if is_maximizing else float('inf')
-    best_move = None
-
-    for move in dividers:
-        if number % move == 0:
-            new_number = number // move
-            temp_score = 1 if new_number % 2 != 0 else -1
-            if new_number % 10 == 0 or new_number % 10 == 5:
-                temp_score += 1
-
-            score = temp_score + minimax(new_number, depth + 1, not is_maximizing)
-
-            if is_maximizing:
-                if score > best_score:
-                    best_score = score
-                    best_move = move
-            else:
-                if score < best_score:
-                    best_score = score
-                    best_move = move
-
-    return best_score if depth > 0 else best_move
-
-
-# Function that generates the first number
-def generate_initial_numbers():
-    numbers = []
-    while len(numbers) < 5:
-        num = random.randint(20000, 30000)
-        if num % 2 == 0 and num % 3 == 0 and num % 4 == 0:
-            numbers.append(num)
-    return numbers
-
-# Function that follows the game's rules
-def process_turn(new_number, player_score, bank):
-    if new_number % 2 == 0:
-        player_score -= 1
-    else:
-        player_score += 1
-    if new_number % 10 == 0 or new_number % 10 == 5:
-        bank += 1
-
-    return new_number, player_score, bank
+import argparse
+from console_engine import minimax, generate_initial_numbers, process_turn
+from game_records import GAME_RECORDS_PATH, GameRecord, GameRecordWriter, encode_state
 
 #%%
 # Principal function to run the game
-def play():
+def play(record_path=None):
     numbers = generate_initial_numbers()
     print(f"You can choose one number between {numbers}")
     chosen_number = int(input("What's your choice ?"))
@@ -68,6 +19,7 @@ def play():
     bank = 0
     current_number = chosen_number
     player_turn = 1  
+    moves = []
 
     while current_number > 10:
         print(f"Current number: {current_number}")
@@ -81,7 +33,7 @@ def play():
                 print("Invalid choice! Please choose one of 2, 3, or 4.")
                 chosen_divider = int(input("With which number do you want to divide? (Choose 2, 3, or 4) "))
 
-
+            moves.append(chosen_divider)
             current_number = round(current_number / chosen_divider)
             current_number, player_1_score, bank = process_turn(current_number, player_1_score, bank)
             player_turn = 2  # Switch turn to Player 2
@@ -89,17 +41,23 @@ def play():
         else:
             chosen_divider = minimax(current_number, 0, True)  # minimax
             print(f"Player 2 chooses to divide by {chosen_divider}")
+            moves.append(chosen_divider)
 
             current_number = round(current_number / chosen_divider)
             current_number, player_2_score, bank = process_turn(current_number, player_2_score, bank)
             player_turn = 1  # Switch turn to Player 1
 
-    # End of the game: Add the bank points to the player who ended the game
-    if player_turn == 1:  # Player 1's turn ended the game
+    # End of the game: Add the bank points to the player who ended the game, as the GUI does
+    if player_turn == 2:  # Player 1 made the last move
         player_1_score += bank
-    else:  # Player 2's turn ended the game
+    else:  # Player 2 made the last move
         player_2_score += bank
 
+    # Keep a record of the game if asked, player 1 playing the part of the GUI's player
+    if record_path is not None:
+        with GameRecordWriter(record_path) as writer:
+            writer.write(GameRecord(encode_state(chosen_number, 0, 0, 0, True), moves))
+
     # Determine the winner
     print(f"Game over! Player 1 score: {player_1_score}, Player 2 score: {player_2_score}")
 
@@ -111,4 +69,8 @@ def play():
         print("It's a draw!")
 
 #%% Run the game
-play()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play against the minimax AI in the console")
+    parser.add_argument("--record", nargs="?", const=GAME_RECORDS_PATH, metavar="FILE",
+                        help="Append the game to a game record file (game_records.bin by default)")
+    play(parser.parse_args().record)
@@ -0,0 +1,116 @@
+#%% Library import
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_processing import chunks, map_in_order
+from code import (GAME_RECORDS_PATH, ai_choose_move, decode_state, divisor_played, process_turn, read_game_records,
+                  solve_exact)
+
+#%% Re-evaluation
+# Every move of every recorded game is compared with the choice of an engine:
+#   exact        The exact solution; also sums the margin each side gave away
+#   minimax:D    Minimax to depth D
+#   alphabeta:D  Alpha-Beta to depth D
+#   pvs:D        Principal Variation Search to depth D
+#   timed:MS     Iterative deepening with MS milliseconds per move
+
+def exact_margin_lost(node, divisor):
+    """Final margin the side to move gives away by playing `divisor` instead of the best move"""
+    new_number, gain, new_bank = process_turn(round(node.number / divisor), 0, node.bank)
+    return solve_exact(node.number, node.bank)[0] - (gain - solve_exact(new_number, new_bank)[0])
+
+def engine_divisor(node, engine, parameter, use_tablebase):
+    """The divisor the engine plays for the side to move at `node`"""
+    # The side to move is searched as the AI
+    own_score, opponent_score = ((node.player_score, node.ai_score) if node.is_player_turn else
+                                 (node.ai_score, node.player_score))
+    result, _, _ = ai_choose_move(node.number, opponent_score, own_score, node.bank, engine == "alphabeta",
+                                  parameter, lazy=True, time_budget_ms=parameter if engine == "timed" else None,
+                                  use_tablebase=use_tablebase, use_pvs=engine == "pvs")
+    return divisor_played(node.number, result.number)
+
+def replay_game(game_id, record, engine, parameter, use_tablebase=False):
+    """Replay one record and return its summary as a dict"""
+    agreed = {"player": 0, "ai": 0}
+    played = {"player": 0, "ai": 0}
+    margin_lost = {"player": 0, "ai": 0}
+    for node, divisor in record.states():
+        if divisor is None:
+            break
+        side = "player" if node.is_player_turn else "ai"
+        played[side] += 1
+        if engine == "exact":
+            lost = exact_margin_lost(node, divisor)
+            margin_lost[side] += lost
+            agreed[side] += lost == 0
+        else:
+            agreed[side] += engine_divisor(node, engine, parameter, use_tablebase) == divisor
+    player_score, ai_score = record.final_scores()
+    summary = {
+        "game": game_id,
+        "start": decode_state(record.start)[0],
+        "timestamp": record.timestamp,
+        "moves": list(record.moves),
+        "scores": [player_score, ai_score],
+        "winner": "player" if player_score > ai_score else "ai" if ai_score > player_score else "draw",
+        "agreement": {side: agreed[side] / played[side] if played[side] else None for side in played},
+    }
+    if engine == "exact":
+        summary["margin_lost"] = margin_lost
+    return summary
+
+def replay_chunk(task):
+    """Worker side: replay a list of (game_id, record) pairs"""
+    games, engine, parameter, use_tablebase = task
+    return [replay_game(game_id, record, engine, parameter, use_tablebase) for game_id, record in games]
+
+#%% Command line
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded games and compare their moves with an engine")
+    parser.add_argument("input", nargs="?", default=GAME_RECORDS_PATH, help="Game record file")
+    parser.add_argument("--engine", default="exact", help="exact, minimax:D, alphabeta:D, pvs:D or timed:MS")
+    parser.add_argument("--tablebase", action="store_true",
+                        help="Let the search engines use the opening book and tablebase when they apply")
+    parser.add_argument("--output", default="-", help="JSON lines file for per-game results (- for stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Games sent to a worker at a time")
+    args = parser.parse_args()
+
+    engine, _, parameter = args.engine.partition(":")
+    if engine not in ("exact", "minimax", "alphabeta", "pvs", "timed"):
+        parser.error(f"unknown engine: {args.engine}")
+    parameter = int(parameter) if parameter else (100 if engine == "timed" else 4)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    counts = {"games": 0, "moves": 0}
+
+    def write_results(summaries):
+        for summary in summaries:
+            output.write(json.dumps(summary) + "\n")
+            counts["games"] += 1
+            counts["moves"] += len(summary["moves"])
+
+    start_time = time.time()
+    # A bounded number of chunks in flight keeps memory flat on any file size
+    max_in_flight = 4 * (args.workers or 1)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            tasks = ((chunk, engine, parameter, args.tablebase)
+                     for chunk in chunks(enumerate(read_game_records(args.input)), args.chunk_size))
+            for summaries in map_in_order(executor, replay_chunk, tasks, max_in_flight):
+                write_results(summaries)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.time() - start_time
+    print(f"Replayed {counts['games']} games ({counts['moves']} moves) in {elapsed:.1f} seconds "
+          f"({counts['games'] / elapsed if elapsed else 0:.0f} games/second)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#%% Library import
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from code import (EndgameExtension, GameRecord, GameRecordWriter, MonteCarloSearch, MoveOrdering, TranspositionTable,
+                  ai_choose_move, divisor_played, encode_state, generate_initial_numbers, process_turn)
+
+#%% Engines
+# An engine spec is "name" or "name:parameter":
+#   minimax:D    Minimax to depth D (default 4)
+#   alphabeta:D  Alpha-Beta to depth D (default 4)
+#   pvs:D        Principal Variation Search to depth D (default 4)
+#   timed:MS     Iterative-deepening Alpha-Beta with MS milliseconds per move
+#   mcts:N       Monte Carlo Tree Search with N iterations per move (default 2000)
+#   greedy       Takes the divisor with the best immediate score
+#   random       Picks a random divisor
+
+class Engine:
+    """One side of a headless game, built from an engine spec
+
+    `seed` seeds the random playouts of an mcts engine.
+    """
+    def __init__(self, spec, use_tablebase=False, extend_endgames=False, seed=None):
+        self.spec = spec
+        self.name, _, parameter = spec.partition(":")
+        if self.name not in ("minimax", "alphabeta", "pvs", "timed", "mcts", "greedy", "random"):
+            raise ValueError(f"Unknown engine: {spec}")
+        self.parameter = int(parameter) if parameter else None
+        self.use_tablebase = use_tablebase
+        self.extend_endgames = extend_endgames
+        self.seed = seed
+        self.new_game()
+
+    def new_game(self):
+        """Forget the tables of the previous game"""
+        self.table = TranspositionTable()
+        self.ordering = MoveOrdering()
+        self.monte_carlo = MonteCarloSearch(self.parameter or 2000, seed=self.seed)
+        self.extension = EndgameExtension() if self.extend_endgames else None
+
+    def choose(self, number, own_score, opponent_score, bank, rng):
+        """Return the divisor to play; the side to move plays the part of the AI"""
+        if self.name == "random":
+            return rng.choice([2, 3, 4])
+        if self.name == "greedy":
+            return max([2, 3, 4], key=lambda divisor: process_turn(round(number / divisor), 0, 0)[1])
+
+        if self.name == "mcts":
+            result, _, _ = ai_choose_move(number, opponent_score, own_score, bank, use_tablebase=self.use_tablebase,
+                                          mcts=self.monte_carlo)
+        elif self.name == "timed":
+            result, _, _ = ai_choose_move(number, opponent_score, own_score, bank, True, table=self.table,
+                                          use_tablebase=self.use_tablebase, time_budget_ms=self.parameter or 100,
+                                          ordering=self.ordering, extension=self.extension)
+        else:
+            result, _, _ = ai_choose_move(number, opponent_score, own_score, bank, self.name == "alphabeta",
+                                          self.parameter or 4, self.table, use_tablebase=self.use_tablebase,
+                                          ordering=self.ordering, use_pvs=self.name == "pvs",
+                                          extension=self.extension)
+        return divisor_played(number, result.number)
+
+#%% Headless game
+
+def play_game(game_id, seed, first_spec, second_spec, use_tablebase=False, extend_endgames=False):
+    """Play one full game between two engine specs and return its record as a dict"""
+    rng = random.Random(seed)
+    random.seed(seed)  # generate_initial_numbers draws from the global generator
+    start_number = rng.choice(generate_initial_numbers())
+    # Seeded from the game's generator too, so an mcts game replays from its seed
+    engines = [Engine(first_spec, use_tablebase, extend_endgames, rng.getrandbits(32)),
+               Engine(second_spec, use_tablebase, extend_endgames, rng.getrandbits(32))]
+
+    number, bank, mover = start_number, 0, 0
+    scores = [0, 0]
+    moves, move_times = [], []
+    while number > 10:
+        start_time = time.perf_counter()
+        divisor = engines[mover].choose(number, scores[mover], scores[1 - mover], bank, rng)
+        move_times.append(round(time.perf_counter() - start_time, 6))
+        moves.append(divisor)
+        number, scores[mover], bank = process_turn(round(number / divisor), scores[mover], bank)
+        mover = 1 - mover
+
+    # The player who made the last move takes the bank
+    scores[1 - mover] += bank
+    winner = 0 if scores[0] > scores[1] else 1 if scores[1] > scores[0] else None
+    return {
+        "game": game_id,
+        "seed": seed,
+        "start": start_number,
+        "engines": [first_spec, second_spec],
+        "moves": moves,
+        "scores": scores,
+        "winner": winner,
+        "move_times": move_times,
+    }
+
+def play_game_task(task):
+    """Unpack a task tuple for ProcessPoolExecutor.map"""
+    return play_game(*task)
+
+#%% Simulator
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless games between two engines in parallel")
+    parser.add_argument("--engine-a", default="alphabeta:4", help="Engine spec of the first side")
+    parser.add_argument("--engine-b", default="random", help="Engine spec of the second side")
+    parser.add_argument("--games", type=int, default=1000, help="Number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first game, later games count up")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--tablebase", action="store_true", help="Let the search engines use the exact tablebase")
+    parser.add_argument("--extend", action="store_true",
+                        help="Let the search engines play small-number leaves out to the end of the game")
+    parser.add_argument("--output", default="-", help="JSON lines file for per-game results (- for stdout)")
+    parser.add_argument("--record", help="Also append the games to this game record file")
+    args = parser.parse_args()
+
+    # Validate the specs before starting the workers
+    Engine(args.engine_a)
+    Engine(args.engine_b)
+
+    # Engines swap sides every game so neither always moves first
+    tasks = []
+    for game_id in range(args.games):
+        specs = (args.engine_a, args.engine_b) if game_id % 2 == 0 else (args.engine_b, args.engine_a)
+        tasks.append((game_id, args.seed + game_id, specs[0], specs[1], args.tablebase, args.extend))
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    record_writer = GameRecordWriter(args.record) if args.record else None
+    wins = {"A": 0, "B": 0, "draw": 0}
+    start_time = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            chunk_size = max(1, min(64, args.games // (4 * (args.workers or 1))))
+            for record in executor.map(play_game_task, tasks, chunksize=chunk_size):
+                output.write(json.dumps(record) + "\n")
+                if record_writer is not None:
+                    # The side moving first plays the part of the GUI's player
+                    record_writer.write(GameRecord(encode_state(record["start"], 0, 0, 0, True), record["moves"]))
+                if record["winner"] is None:
+                    wins["draw"] += 1
+                elif (record["winner"] == 0) == (record["game"] % 2 == 0):
+                    wins["A"] += 1
+                else:
+                    wins["B"] += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if record_writer is not None:
+            record_writer.close()
+
+    elapsed = time.time() - start_time
+    print(f"{args.games} games in {elapsed:.1f} seconds ({60 * args.games / elapsed:.0f} games/minute)",
+          file=sys.stderr)
+    print(f"  A ({args.engine_a}) wins: {wins['A']}", file=sys.stderr)
+    print(f"  B ({args.engine_b}) wins: {wins['B']}", file=sys.stderr)
+    print(f"  Draws: {wins['draw']}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
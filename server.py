@@ -0,0 +1,287 @@
+#%% Library import
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from code import SearchStats, ai_choose_move, divisor_played, generate_initial_numbers, process_turn
+
+#%% Protocol
+# One JSON object per line in each direction. Every request has an "op" and
+# may carry an "id" that is echoed back. Replies have "ok": true and the
+# result fields, or "ok": false and an "error" message.
+#
+#   {"op": "new_game", "first": "player"|"ai", "number": N, "algorithm": "minimax"|"alphabeta"|"pvs",
+#    "depth": D, "time_budget_ms": MS, "tablebase": false, "book": true}    all fields optional, starts a session;
+#    with "tablebase": true the opening book and tablebase answer the AI's moves they cover,
+#    and "book": false then leaves the opening book out
+#   {"op": "move", "session": S, "divisor": 2|3|4}    the player's move
+#   {"op": "ai_move", "session": S}    the AI searches and plays its move
+#   {"op": "state", "session": S}
+#   {"op": "close", "session": S}    sessions left open are closed when their connection closes
+#   {"op": "metrics"}    request latencies, search queue depth and session count
+#
+# AI searches run in a process pool. When `max_pending` searches are already
+# queued or running, ai_move is refused with "busy" instead of queued, so a
+# client flood cannot grow the queue without bound.
+
+ALGORITHMS = ("minimax", "alphabeta", "pvs")
+LATENCY_WINDOW = 1000  # Latencies kept per operation for the percentiles
+
+class RequestError(Exception):
+    """A request that cannot be served, reported to the client as the error message"""
+
+class Session:
+    """State of one game played through the server"""
+    def __init__(self, number, player_turn, algorithm, depth, time_budget_ms, use_tablebase=False, use_book=True):
+        self.number = number
+        self.player_score = 0
+        self.ai_score = 0
+        self.bank = 0
+        self.player_turn = player_turn
+        self.algorithm = algorithm
+        self.depth = depth
+        self.time_budget_ms = time_budget_ms
+        self.use_tablebase = use_tablebase
+        self.use_book = use_book
+        self.moves = []
+        self.searching = False  # One AI search at a time per game
+
+    @property
+    def game_over(self):
+        return self.number <= 10
+
+    def play(self, divisor):
+        """Apply a divisor for the side to move, ending the game when the number reaches 10"""
+        if self.player_turn:
+            self.number, self.player_score, self.bank = process_turn(round(self.number / divisor),
+                                                                     self.player_score, self.bank)
+        else:
+            self.number, self.ai_score, self.bank = process_turn(round(self.number / divisor),
+                                                                 self.ai_score, self.bank)
+        self.moves.append(divisor)
+        self.player_turn = not self.player_turn
+        if self.game_over:
+            # The player who made the last move takes the bank
+            if self.player_turn:
+                self.ai_score += self.bank
+            else:
+                self.player_score += self.bank
+            self.bank = 0
+
+    def as_dict(self):
+        state = {
+            "number": self.number,
+            "player_score": self.player_score,
+            "ai_score": self.ai_score,
+            "bank": self.bank,
+            "turn": "player" if self.player_turn else "ai",
+            "moves": self.moves,
+            "game_over": self.game_over,
+        }
+        if self.game_over:
+            state["winner"] = ("player" if self.player_score > self.ai_score else
+                               "ai" if self.ai_score > self.player_score else "draw")
+        return state
+
+def search_move(number, player_score, ai_score, bank, algorithm, depth, time_budget_ms, use_tablebase, use_book):
+    """Worker side of ai_move: return (divisor, search statistics)"""
+    result, _, stats = ai_choose_move(number, player_score, ai_score, bank, algorithm == "alphabeta", depth,
+                                      lazy=True, use_tablebase=use_tablebase, time_budget_ms=time_budget_ms,
+                                      use_pvs=algorithm == "pvs", stats=SearchStats(),
+                                      use_book=use_book)
+    return divisor_played(number, result.number), stats.as_dict()
+
+#%% Server
+
+class GameServer:
+    """Asyncio line-protocol server keeping every game in memory"""
+    def __init__(self, workers=None, max_pending=None, max_sessions=10000):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending or 4 * (workers or os.cpu_count() or 1)
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.pending = 0  # AI searches queued or running in the pool
+        self.max_pending_seen = 0
+        self.rejected = 0
+        self.latencies = {}  # Operation -> recent latencies in seconds
+        self.request_counts = {}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise RequestError("unknown session")
+        return session
+
+    async def handle_request(self, request, owned_sessions):
+        """Serve one decoded request and return the reply fields
+
+        `owned_sessions` holds the ids of the sessions started by the
+        connection, closed with it.
+        """
+        op = request.get("op")
+        if op == "new_game":
+            reply = self.new_game(request)
+            owned_sessions.add(reply["session"])
+            return reply
+        if op == "move":
+            session = self.session(request)
+            if session.game_over or not session.player_turn or session.searching:
+                raise RequestError("not the player's turn")
+            divisor = request.get("divisor")
+            if type(divisor) is not int or divisor not in (2, 3, 4):
+                raise RequestError("divisor must be 2, 3 or 4")
+            session.play(divisor)
+            return {"state": session.as_dict()}
+        if op == "ai_move":
+            return await self.ai_move(self.session(request))
+        if op == "state":
+            return {"state": self.session(request).as_dict()}
+        if op == "close":
+            self.session(request)
+            del self.sessions[request["session"]]
+            owned_sessions.discard(request["session"])
+            return {}
+        if op == "metrics":
+            return {"metrics": self.metrics()}
+        raise RequestError(f"unknown op: {op}")
+
+    def new_game(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise RequestError("too many sessions")
+        number = request.get("number") or random.choice(generate_initial_numbers())
+        algorithm = request.get("algorithm", "alphabeta")
+        depth = request.get("depth", 4)
+        time_budget_ms = request.get("time_budget_ms")
+        use_tablebase = request.get("tablebase", False)
+        use_book = request.get("book", True)
+        if type(number) is not int or number <= 10:
+            raise RequestError("number must be an integer above 10")
+        if algorithm not in ALGORITHMS:
+            raise RequestError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+        if type(depth) is not int or not 1 <= depth <= 10:
+            raise RequestError("depth must be between 1 and 10")
+        if time_budget_ms is not None and (type(time_budget_ms) is not int or not 1 <= time_budget_ms <= 10000):
+            raise RequestError("time_budget_ms must be between 1 and 10000")
+        if not isinstance(use_tablebase, bool):
+            raise RequestError("tablebase must be true or false")
+        if not isinstance(use_book, bool):
+            raise RequestError("book must be true or false")
+        session_id = next(self.session_ids)
+        self.sessions[session_id] = Session(number, request.get("first", "player") != "ai", algorithm, depth,
+                                            time_budget_ms, use_tablebase, use_book)
+        return {"session": session_id, "state": self.sessions[session_id].as_dict()}
+
+    async def ai_move(self, session):
+        if session.game_over or session.player_turn or session.searching:
+            raise RequestError("not the AI's turn")
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise RequestError("busy")
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        session.searching = True
+        try:
+            divisor, stats = await asyncio.get_running_loop().run_in_executor(
+                self.executor, search_move, session.number, session.player_score, session.ai_score, session.bank,
+                session.algorithm, session.depth, session.time_budget_ms, session.use_tablebase,
+                session.use_book)
+        finally:
+            self.pending -= 1
+            session.searching = False
+        session.play(divisor)
+        return {"divisor": divisor, "state": session.as_dict(), "search": stats}
+
+    def record_latency(self, op, latency):
+        if op not in self.latencies:
+            self.latencies[op] = deque(maxlen=LATENCY_WINDOW)
+            self.request_counts[op] = 0
+        self.latencies[op].append(latency)
+        self.request_counts[op] += 1
+
+    def metrics(self):
+        latencies = {}
+        for op, recent in self.latencies.items():
+            ordered = sorted(recent)
+            latencies[op] = {
+                "count": self.request_counts[op],
+                "mean_ms": 1000 * sum(ordered) / len(ordered),
+                "p50_ms": 1000 * ordered[len(ordered) // 2],
+                "p95_ms": 1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                "max_ms": 1000 * ordered[-1],
+            }
+        return {
+            "sessions": len(self.sessions),
+            "queue_depth": self.pending,
+            "max_queue_depth": self.max_pending_seen,
+            "queue_limit": self.max_pending,
+            "rejected": self.rejected,
+            "latency": latencies,
+        }
+
+    async def handle_client(self, reader, writer):
+        """Serve the requests of one connection in order until it closes, then close its sessions"""
+        owned_sessions = set()
+        try:
+            while line := await reader.readline():
+                start_time = time.perf_counter()
+                request = {}
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        request = {}
+                        raise RequestError("a request must be a JSON object")
+                    reply = {"ok": True, **await self.handle_request(request, owned_sessions)}
+                except json.JSONDecodeError:
+                    reply = {"ok": False, "error": "invalid JSON"}
+                except RequestError as error:
+                    reply = {"ok": False, "error": str(error)}
+                except Exception as error:  # Keep serving the other requests
+                    reply = {"ok": False, "error": f"internal error: {error}"}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+                self.record_latency(str(request.get("op", "invalid")), time.perf_counter() - start_time)
+        except ConnectionError:
+            pass
+        finally:
+            # A session lives as long as the connection that started it, so abandoned games cannot pile up
+            for session_id in owned_sessions:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+async def serve(host, port, workers, max_pending):
+    game_server = GameServer(workers, max_pending)
+    server = await asyncio.start_server(game_server.handle_client, host, port)
+    print(f"Serving games on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many concurrent games over a JSON line protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Search processes")
+    parser.add_argument("--max-pending", type=int, help="AI searches queued or running before refusing more "
+                                                        "(default 4 per worker)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()